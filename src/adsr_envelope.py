@@ -1,61 +1,467 @@
 #python3
-import itertools
+import math
+import functools
+import numpy as np
+from base_osc import get_dtype
+from buffer_pool import BufferPool
+
+_curve_cache_size = 128 # number of envelope settings kept
+_curves = {"linear": None, "exp": 5., "log": 5., "power": 2.} # curve: default amount
 
 class ADSREnvelope:
+    """
+    curve shapes the segments: "linear", "exp" (slow then fast),
+    "log" (fast then slow) or "power" (x**curve_amount), as given for the attack,
+    decay and release are its mirror image, so "exp" falls fast then slow
+    like an RC discharge
+    """
+    ended = False # known before iteration, for the voices built on it
+
     def __init__(self, attack_duration=0.05, decay_duration=0.2, sustain_level=0.7, \
-                 release_duration=0.3, sample_rate=44100):
+                 release_duration=0.3, sample_rate=44100, curve="linear", curve_amount=None):
         self.attack_duration = attack_duration
         self.decay_duration = decay_duration
         self.sustain_level = sustain_level
         self.release_duration = release_duration
         self._sample_rate = sample_rate
-        
-    def get_ads_stepper(self):
+        if curve not in _curves:
+            raise ValueError(f"curve '{curve}' does not exist")
+        self.curve = curve
+        self.curve_amount = _curves[curve] if curve_amount is None else curve_amount
+        if curve in ("exp", "log") and self.curve_amount == 0:
+            # the curve is normalized by expm1(curve_amount)
+            raise ValueError(f"curve '{curve}' needs a curve_amount other than 0, use 'linear'")
+        self._pool = BufferPool()
+
+    def _init_ads_state(self):
+        # steppers as in itertools.count, values are accumulated by addition
         steppers = []
         if self.attack_duration > 0:
-            steppers.append(itertools.count(start=0, \
-                step= 1 / (self.attack_duration * self._sample_rate)))
+            steppers.append((0, 1 / (self.attack_duration * self._sample_rate)))
         if self.decay_duration > 0:
-            steppers.append(itertools.count(start=1, \
-            step=-(1 - self.sustain_level) / (self.decay_duration  * self._sample_rate)))
-        while True:
-            l = len(steppers)
-            if l > 0:
-                val = next(steppers[0])
-                if l == 2 and val > 1:
-                    steppers.pop(0)
-                    val = next(steppers[0])
-                elif l == 1 and val < self.sustain_level:
-                    steppers.pop(0)
-                    val = self.sustain_level
-            else:
-                val = self.sustain_level
-            yield val
-    
-    def get_r_stepper(self):
-        val = 1
+            steppers.append((1, -(1 - self.sustain_level) / (self.decay_duration  * self._sample_rate)))
+        self._nst = len(steppers)
+        steppers.extend([(0., 0.)] * (2 - self._nst))
+        ((self._c0, self._st0), (self._c1, self._st1)) = steppers
+
+    def _init_r_state(self):
+        # val <= 0 ends the envelope
         if self.release_duration > 0:
-            release_step = - self.val / (self.release_duration * self._sample_rate)
-            stepper = itertools.count(self.val, step=release_step)
+            self._rv = 1
+            self._rc = self.val
+            self._rst = - self.val / (self.release_duration * self._sample_rate)
         else:
-            val = -1
-        while True:
-            if val <= 0:
-                self.ended = True
-                val = 0
-            else:
-                val = next(stepper)
-            yield val
-    
+            self._rv = -1
+            self._rc = self._rst = 0
+
     def __iter__(self):
         self.val = 0
         self.ended = False
-        self.stepper = self.get_ads_stepper()
+        self._releasing = False
+        self._release_at = None # samples left before a scheduled release
+        if self.curve == "linear":
+            self._init_ads_state()
+        else:
+            self._set_segment(0)
         return self
-    
+
+    def _set_segment(self, seg):
+        # curved segments: 0 attack, 1 decay, 2 sustain, 3 release, 4 ended
+        self._seg = seg
+        self._j =0 # sample index in the segment
+        self._g =1. # exp(c * j / len), stepped by one multiply per sample
+        self._diffs = None # forward differences of the power curve
+        if seg == 0:
+            (dur, self._start, self._end) = (self.attack_duration, 0., 1.)
+        elif seg == 1:
+            (dur, self._start, self._end) = (self.decay_duration, 1., self.sustain_level)
+        elif seg == 3:
+            (dur, self._start, self._end) = (self.release_duration, self.val, 0.)
+        else:
+            return
+        self._len = int(dur * self._sample_rate)
+        if self._len <= 0:
+            if seg < 2:
+                self._set_segment(seg +1)
+            return
+        # falling segments mirror the rising shape
+        self._fall = self._end < self._start
+        self._int_power = float(self.curve_amount).is_integer() and self.curve_amount >= 0
+        c = self.curve_amount if self.curve == "exp" else -self.curve_amount
+        if self._fall:
+            c = -c
+        self._r = math.exp(c / self._len)
+        self._norm = math.expm1(c)
+
+    def _power(self, j):
+        # power curve at sample j of the segment, j can be an array
+        x = j / self._len
+        if self._fall:
+            return 1 - (1 - x) ** self.curve_amount
+        return x ** self.curve_amount
+
+    def _init_power(self):
+        # an integer amount gives the integer polynomial u = j**a, (len - j)**a
+        # when falling, stepped by additions on its exact forward differences
+        # from the current sample, then scaled by one multiply
+        (order, j) = (int(self.curve_amount), self._j)
+        u = (lambda k: (self._len - k) ** order) if self._fall else (lambda k: k ** order)
+        d = [u(j + k) for k in range(order +1)]
+        for k in range(1, order +1):
+            for i in range(order, k -1, -1):
+                d[i] -= d[i -1]
+        self._diffs = d
+        self._orders = range(order)
+        self._scale = (-1 if self._fall else 1) / self._len ** order
+
+    def _next_power(self):
+        if not self._int_power:
+            return self._power(self._j)
+        if self._diffs is None:
+            self._init_power()
+        d = self._diffs
+        y = d[0] * self._scale
+        for i in self._orders:
+            d[i] += d[i +1]
+        return y + 1 if self._fall else y
+
+    def _next_segment(self):
+        self._set_segment(4 if self._seg == 3 else self._seg +1)
+
+    def _next_curved(self):
+        while self._seg != 2 and self._seg != 4 and self._j >= self._len:
+            self._next_segment()
+        if self._seg == 2:
+            return self.sustain_level
+        if self._seg == 4:
+            self.ended = True
+            return 0
+        if self.curve == "power":
+            y = self._next_power()
+        else:
+            y = (self._g - 1) / self._norm
+            self._g *= self._r
+        self._j += 1
+        return self._start + (self._end - self._start) * y
+
+    def _render_curved(self, out):
+        n = len(out)
+        i =0
+        while i < n:
+            if self._seg == 2:
+                out[i:] = self.val = self.sustain_level
+                break
+            if self._seg == 4:
+                self.ended = True
+                out[i:] = self.val =0
+                break
+            if self._j >= self._len:
+                self._next_segment()
+                continue
+            # the rest of the segment in closed form, from the stepped state
+            k = min(n - i, self._len - self._j)
+            steps = np.arange(k)
+            if self.curve == "power":
+                y = self._power(self._j + steps)
+                self._diffs = None
+            else:
+                y = (self._g * self._r ** steps - 1) / self._norm
+                self._g *= self._r ** k
+            vals = self._start + (self._end - self._start) * y
+            out[i:i+k] = vals
+            self.val = vals[-1]
+            self._j += k
+            i += k
+
+    def _next_ads(self):
+        if self._nst == 2:
+            val = self._c0
+            self._c0 += self._st0
+            if val > 1:
+                self._nst = 1
+                self._c0 = self._c1; self._st0 = self._st1
+                val = self._c0
+                self._c0 += self._st0
+        elif self._nst == 1:
+            val = self._c0
+            self._c0 += self._st0
+            if val < self.sustain_level:
+                self._nst = 0
+                val = self.sustain_level
+        else:
+            val = self.sustain_level
+        return val
+
+    def _next_r(self):
+        if self._rv <= 0:
+            self.ended = True
+            self._rv = 0
+        else:
+            self._rv = self._rc
+            self._rc += self._rst
+        return self._rv
+
     def __next__(self):
-        self.val = next(self.stepper)
+        if self._release_at == 0:
+            self._start_release()
+        elif self._release_at is not None:
+            self._release_at -= 1
+        if self.curve != "linear":
+            self.val = self._next_curved()
+        else:
+            self.val = self._next_r() if self._releasing else self._next_ads()
         return self.val
-        
-    def trigger_release(self):
-        self.stepper = self.get_r_stepper()
+
+    def _steps(self, start, step, n):
+        # same values as adding step n times, like itertools.count
+        vals = self._pool.get("steps", n, dtype='float64')
+        vals.fill(step)
+        vals[0] = start
+        return np.cumsum(vals, out=vals)
+
+    def _first(self, cond, vals, level):
+        # index of the first value meeting cond against level, None without one
+        mask = cond(vals, level, out=self._pool.get("mask", len(vals), dtype=bool))
+        j = int(mask.argmax())
+        return j if mask[j] else None
+
+    def _render_ads(self, out):
+        n = len(out)
+        i =0
+        sustain = self.sustain_level
+        while i < n:
+            if self._nst == 2:
+                # attack ends on its first value above 1
+                k = n - i
+                if self._st0 > 0:
+                    k = min(k, max(int((1 - self._c0) / self._st0) + 2, 1))
+                vals = self._steps(self._c0, self._st0, k)
+                above = self._first(np.greater, vals, 1)
+                j = k if above is None else above
+                out[i:i+j] = vals[:j]
+                if j > 0:
+                    self._c0 = vals[j-1] + self._st0
+                    self.val = vals[j-1]
+                i += j
+                if above is not None:
+                    # that sample gives the first decay value
+                    self._nst = 1
+                    self._c0 = self._c1; self._st0 = self._st1
+                    out[i] = self.val = self._c0
+                    self._c0 += self._st0
+                    i += 1
+            elif self._nst == 1:
+                # the first value below sustain is replaced by sustain
+                k = n - i
+                if self._st0 < 0:
+                    k = min(k, max(int((self._c0 - sustain) / -self._st0) + 2, 1))
+                vals = self._steps(self._c0, self._st0, k)
+                below = self._first(np.less, vals, sustain)
+                j = k if below is None else below
+                out[i:i+j] = vals[:j]
+                if j > 0:
+                    self._c0 = vals[j-1] + self._st0
+                    self.val = vals[j-1]
+                i += j
+                if below is not None:
+                    self._nst =0
+                    self._c0 = vals[j] + self._st0
+                    out[i] = self.val = sustain
+                    i += 1
+            else:
+                out[i:] = self.val = sustain
+                i = n
+
+    def _render_r(self, out):
+        n = len(out)
+        i =0
+        while i < n and self._rv > 0:
+            # release ends on its first value not above 0
+            k = n - i
+            if self._rst < 0:
+                k = min(k, max(int(self._rc / -self._rst) + 2, 1))
+            vals = self._steps(self._rc, self._rst, k)
+            stop = self._first(np.less_equal, vals, 0)
+            j = k if stop is None else stop +1
+            out[i:i+j] = vals[:j]
+            self._rv = vals[j-1]
+            self._rc = vals[j-1] + self._rst
+            i += j
+        if i < n:
+            # the envelope ends on the next sample
+            self.ended = True
+            self._rv =0
+            out[i:] =0
+        self.val = self._rv
+
+    def _render_segments(self, out):
+        if len(out) == 0:
+            return
+        if self.curve != "linear":
+            self._render_curved(out)
+        elif self._releasing:
+            self._render_r(out)
+        else:
+            self._render_ads(out)
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        each segment is filled up to its boundary in one slice
+        """
+        if out is None:
+            out = np.empty(n, dtype=get_dtype())
+        start =0
+        if self._release_at is not None:
+            # a release scheduled inside the block starts on its sample
+            start = min(self._release_at, n)
+            self._render_segments(out[:start])
+            self._release_at -= start
+            if self._release_at == 0 and start < n:
+                self._start_release()
+        self._render_segments(out[start:])
+        return out
+
+    def _start_release(self):
+        self._release_at = None
+        self._releasing = True
+        if self.curve == "linear":
+            self._init_r_state()
+        else:
+            self._set_segment(3)
+
+    def trigger_release(self, offset=0):
+        """ starts the release, or after offset samples """
+        if offset > 0 and not self._releasing:
+            self._release_at = offset
+        else:
+            self._start_release()
+
+#========================================
+
+@functools.lru_cache(maxsize=_curve_cache_size)
+def get_envelope_curves(attack_duration, decay_duration, sustain_level, \
+        release_duration, sample_rate, curve="linear", curve_amount=None):
+    """
+    returns (ads, release) curves shared by all voices,
+    ads ends at the sustain level, or is None if it never reaches it,
+    release is a unit ramp ending on its first value not above 0
+    """
+    if curve != "linear":
+        return _get_curved_curves(attack_duration, decay_duration, sustain_level,
+                release_duration, sample_rate, curve, curve_amount)
+    env = iter(ADSREnvelope(attack_duration, decay_duration, sustain_level,
+            0, sample_rate))
+    ads = np.empty(int((attack_duration + decay_duration) * sample_rate) + 3)
+    env._render_ads(ads)
+    if env._nst != 0:
+        ads = None
+    else:
+        ads.setflags(write=False)
+    release = np.empty(0)
+    if release_duration > 0:
+        size = int(release_duration * sample_rate) + 3
+        # copied out of the scratch array of env
+        release = env._steps(1., -1 / (release_duration * sample_rate), size).copy()
+        stop = np.flatnonzero(release <= 0)
+        if len(stop):
+            release = release[:stop[0] +1]
+    release.setflags(write=False)
+    return (ads, release)
+
+def _get_curved_curves(attack_duration, decay_duration, sustain_level, \
+        release_duration, sample_rate, curve, curve_amount):
+    # rendered by a curved envelope, the release has one value per sample
+    env = iter(ADSREnvelope(attack_duration, decay_duration, sustain_level,
+            release_duration, sample_rate, curve, curve_amount))
+    ads = np.empty(int(attack_duration * sample_rate) + int(decay_duration * sample_rate) +1)
+    env._render_curved(ads)
+    env.val =1.
+    env._set_segment(3)
+    release = np.empty(env._len if env._seg == 3 else 0)
+    env._render_curved(release)
+    ads.setflags(write=False)
+    release.setflags(write=False)
+    return (ads, release)
+
+#========================================
+
+class CachedADSREnvelope(ADSREnvelope):
+    """
+    plays back curves precomputed once per envelope settings,
+    the release is scaled from the level at release time,
+    so it can end one sample apart from ADSREnvelope
+    """
+    def __init__(self, attack_duration=0.05, decay_duration=0.2, sustain_level=0.7, \
+                 release_duration=0.3, sample_rate=44100, curve="linear", curve_amount=None):
+        super().__init__(attack_duration, decay_duration, sustain_level,
+                release_duration, sample_rate, curve, curve_amount)
+
+    def __iter__(self):
+        super().__iter__()
+        (self._ads, self._release) = get_envelope_curves(self.attack_duration,
+                self.decay_duration, self.sustain_level, self.release_duration,
+                self._sample_rate, self.curve, self.curve_amount)
+        self._pos =0
+        return self
+
+    def __next__(self):
+        if self._ads is None:
+            return super().__next__()
+        if self._release_at == 0:
+            self._start_release()
+        elif self._release_at is not None:
+            self._release_at -= 1
+        # the curves are read in place, as in _play_ads and _play_release
+        pos = self._pos
+        self._pos += 1
+        if not self._releasing:
+            self.val = self._ads[pos] if pos < len(self._ads) else self.sustain_level
+        elif pos < self._release_len:
+            self.val = self._level * self._release[pos]
+        else:
+            # the envelope ends on the sample after the curve
+            self.ended = True
+            self.val =0
+        return self.val
+
+    def _start_release(self):
+        super()._start_release()
+        self._level = self.val
+        # a linear release from 0 ends after one sample
+        self._release_len = len(self._release)
+        if self.val <= 0 and self.curve == "linear":
+            self._release_len = min(self._release_len, 1)
+        self._pos =0
+
+    def _play_ads(self, out):
+        n = len(out)
+        m = min(max(len(self._ads) - self._pos, 0), n)
+        out[:m] = self._ads[self._pos:self._pos + m]
+        out[m:] = self.sustain_level
+        self.val = self._ads[self._pos + m -1] if m == n else self.sustain_level
+        self._pos += n
+
+    def _play_release(self, out):
+        n = len(out)
+        m = min(max(self._release_len - self._pos, 0), n)
+        np.multiply(self._release[self._pos:self._pos + m], self._level, out=out[:m])
+        self.val = self._level * self._release[self._pos + m -1] if m > 0 else 0
+        if m < n:
+            # the envelope ends on the sample after the curve
+            self.ended = True
+            out[m:] =0
+            self.val =0
+        self._pos += n
+
+    def _render_segments(self, out):
+        if self._ads is None:
+            super()._render_segments(out)
+        elif len(out) == 0:
+            return
+        elif self._releasing:
+            self._play_release(out)
+        else:
+            self._play_ads(out)
+
+#========================================
@@ -4,6 +4,55 @@
 """
 
 from abc import ABC, abstractmethod
+import numpy as np
+import buffer_pool # module import, buffer_pool imports base_osc
+
+_dtype = np.dtype('float64') # sample dtype for blocks
+
+# fixed point phase accumulator, one cycle is 2**32
+_phase_bits = 32
+_phase_mask = (1 << _phase_bits) -1
+phase_to_cycles = 1 / (1 << _phase_bits)
+
+def freq_to_inc(freq, sample_rate):
+    """ returns the phase accumulator increment for freq """
+    return int(round(freq * (1 << _phase_bits) / sample_rate)) & _phase_mask
+
+#-------------------------------------------
+
+def set_dtype(dtype):
+    """ sets the sample dtype used for blocks in this process """
+    global _dtype
+    _dtype = np.dtype(dtype)
+
+#-------------------------------------------
+
+def get_dtype():
+    """ returns the sample dtype used for blocks """
+    return _dtype
+
+#-------------------------------------------
+
+def get_block(gen, n, out=None):
+    """
+    returns the next n samples from any generator as numpy array,
+    using its render method when it exists
+    """
+    if hasattr(gen, "render"):
+        return gen.render(n, out)
+    block = np.array([next(gen) for _ in range(n)], dtype=_dtype)
+    if out is None:
+        return block
+    out[:] = block
+    return out
+
+#-------------------------------------------
+
+def get_channels(gen):
+    """ returns the channels of the blocks of a generator, 1 unless it declares them """
+    return getattr(gen, "channels", 1)
+
+#-------------------------------------------
 
 class BaseOsc(ABC):
     def __init__(self, freq=440, phase=0, amp=1, \
@@ -18,6 +67,8 @@ class BaseOsc(ABC):
         self._f = freq
         self._a = amp
         self._p = phase
+        self._mod_incs = None # per sample increments of a modulated block
+        self._pool = buffer_pool.BufferPool() # scratch arrays for render
         # self._i =0
         # self._step =0
         
@@ -73,14 +124,73 @@ class BaseOsc(ABC):
     def _initialize_osc(self):
         pass
     
+    def _get_inc(self, freq):
+        return freq_to_inc(freq, self._sample_rate)
+
+    def _init_acc(self):
+        self._acc =0
+
+    def _next_acc(self):
+        """ returns the phase accumulator and advances it by one sample """
+        acc = self._acc
+        self._acc = (acc + self._inc) & _phase_mask
+        return acc
+
+    def _acc_block(self, n):
+        """
+        returns the phase accumulator for the next n samples,
+        as uint32 array that wraps without losing precision
+        """
+        # in a scratch array, valid until the next block
+        acc = self._pool.get("acc", n, dtype=np.uint32)
+        if self._mod_incs is not None:
+            # frequency modulation, the increments are summed up
+            steps = np.cumsum(self._mod_incs, out=self._pool.get("steps", n, dtype='int64'))
+            if n > 0:
+                end = int(self._acc + steps[-1]) & _phase_mask
+            np.subtract(steps, self._mod_incs, out=steps)
+            np.add(steps, self._acc, out=steps)
+            np.bitwise_and(steps, _phase_mask, out=steps)
+            np.copyto(acc, steps, casting='unsafe')
+            if n > 0:
+                self._acc = end
+            return acc
+        np.multiply(self._pool.ramp(n, np.uint32), np.uint32(self._inc), out=acc)
+        np.add(acc, np.uint32(self._acc), out=acc)
+        self._acc = (self._acc + self._inc * n) & _phase_mask
+        return acc
+
     @staticmethod
     def squish_val(val, min_val=0, max_val=1):
         return (((val + 1) / 2 ) * (max_val - min_val)) + min_val
 
+    def _scale_block(self, val, out=None):
+        """ applies wave_range and amp to a block in range (-1, 1) """
+        if self._wave_range != (-1, 1):
+            val = self.squish_val(val, *self._wave_range)
+        if out is None:
+            out = np.empty(np.shape(val), dtype=_dtype)
+        if np.result_type(val, self._a) != out.dtype:
+            # scaled in val then cast, a ufunc casting into out buffers its result
+            np.copyto(out, np.multiply(val, self._a, out=val), casting='unsafe')
+            return out
+        return np.multiply(val, self._a, out=out)
+
     @abstractmethod
     def __next__(self):
         return None
     
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        subclasses override it with a vectorized version
+        """
+        if out is None:
+            out = np.empty(n, dtype=_dtype)
+        for i in range(n):
+            out[i] = next(self)
+        return out
+    
     def __iter__(self):
         self.freq = self._freq
         self.phase = self._phase
@@ -0,0 +1,235 @@
+#! /usr/bin/env python3
+"""
+    Benchmarks for oscillators
+    CPU per voice and accuracy against the analytic oscillators
+"""
+import time
+import math
+import numpy as np
+import base_osc
+import dsp_kernels
+from oscillators import (
+        SineOscillator,
+        SawtoothOscillator,
+        SquareOscillator,
+        TriangleOscillator,
+        )
+from wavetable import WavetableOscillator, LutSineOscillator
+from chain import Chain
+from adsr_envelope import ADSREnvelope
+from modulated_oscillator import ModulatedOscillator
+from panner import Panner
+from wave_adder_recode import WaveAdder
+from fm_voice import FMBank, FMVoice
+from blep_oscillators import (
+        BlepSawtoothOscillator,
+        BlepSquareOscillator,
+        BlepTriangleOscillator,
+        )
+
+_rate = 44100
+_block_size = 1024
+_nb_blocks = 43 # about 1 second
+
+def time_render(osc, nb_blocks=_nb_blocks, block_size=_block_size):
+    """ returns seconds spent to render nb_blocks blocks """
+    iter(osc)
+    start = time.perf_counter()
+    for _ in range(nb_blocks):
+        osc.render(block_size)
+    return time.perf_counter() - start
+
+#-------------------------------------------
+
+def time_next(osc, nb_samples=_nb_blocks * _block_size):
+    """ returns seconds spent to render nb_samples samples one by one """
+    iter(osc)
+    start = time.perf_counter()
+    for _ in range(nb_samples):
+        next(osc)
+    return time.perf_counter() - start
+
+#-------------------------------------------
+
+def get_errors(osc, ref, n=_rate):
+    """
+    returns max and rms differences between two oscillators,
+    max error is dominated by the discontinuities of saw and square
+    """
+    iter(osc); iter(ref)
+    diff = osc.render(n) - ref.render(n)
+    return (np.abs(diff).max(), np.sqrt(np.mean(diff**2)))
+
+#-------------------------------------------
+
+def bench_wavetable(freq=440.):
+    print("Wavetable vs analytic, CPU per voice for 1 sec of audio")
+    analytic = [
+            ("sine", SineOscillator),
+            ("saw", SawtoothOscillator),
+            ("square", SquareOscillator),
+            ("triangle", TriangleOscillator),
+            ]
+    for (waveform, cls) in analytic:
+        t_next = time_next(cls(freq, sample_rate=_rate))
+        t_block = time_render(cls(freq, sample_rate=_rate))
+        print(f"  {waveform:8} analytic:  next {t_next*1000:8.3f} ms, render {t_block*1000:7.3f} ms")
+        for interp in ("linear", "cubic"):
+            osc = WavetableOscillator(freq, sample_rate=_rate,
+                    waveform=waveform, interp=interp)
+            t_next = time_next(osc)
+            t_block = time_render(osc)
+            (err, rms) = get_errors(osc, cls(freq, sample_rate=_rate))
+            print(f"  {waveform:8} {interp:7}  next {t_next*1000:8.3f} ms, render {t_block*1000:7.3f} ms, "
+                    f"max error {err:.2e}, rms error {rms:.2e}")
+
+#-------------------------------------------
+
+def bench_blep(freq=440.):
+    print("Band limited vs naive, CPU per voice for 1 sec of audio")
+    pairs = [
+            ("saw", SawtoothOscillator, BlepSawtoothOscillator),
+            ("square", SquareOscillator, BlepSquareOscillator),
+            ("triangle", TriangleOscillator, BlepTriangleOscillator),
+            ]
+    for (waveform, naive, blep) in pairs:
+        t_naive = time_render(naive(freq, sample_rate=_rate))
+        t_blep = time_render(blep(freq, sample_rate=_rate))
+        print(f"  {waveform:8} naive {t_naive*1000:7.3f} ms, blep {t_blep*1000:7.3f} ms, "
+                f"ratio {t_blep/t_naive:5.2f}")
+
+#-------------------------------------------
+
+def _make_graph():
+    return WaveAdder(
+        SineOscillator(220, sample_rate=_rate),
+        Chain(TriangleOscillator(330, amp=0.8, sample_rate=_rate), Panner(0.3)),
+        BlepSawtoothOscillator(110, amp=0.6, sample_rate=_rate),
+        WavetableOscillator(440, amp=0.4, sample_rate=_rate, interp="cubic"),
+        stereo=True,
+        )
+
+#-------------------------------------------
+
+def bench_dtype():
+    """ float32 vs float64 rendering, the error bound is checked in tests/test_wave_adder.py """
+    print("float32 vs float64 rendering, 1 sec of audio")
+    blocks = {}
+    for dtype in ("float64", "float32"):
+        base_osc.set_dtype(dtype)
+        gen = iter(_make_graph())
+        start = time.perf_counter()
+        blocks[dtype] = np.concatenate([gen.render(_block_size) for _ in range(_nb_blocks)])
+        elapsed = time.perf_counter() - start
+        print(f"  {dtype}  {elapsed*1000:7.3f} ms, {blocks[dtype].nbytes} bytes")
+    base_osc.set_dtype("float64")
+    err = np.abs(blocks["float32"] - blocks["float64"]).max()
+    print(f"  max error {err:.2e}")
+
+#-------------------------------------------
+
+def bench_jit():
+    print("Numba kernels vs pure python, 1 sec of audio")
+    if dsp_kernels.set_backend("numba") != "numba":
+        print("  numba is not installed")
+        return
+    dsp_kernels.set_backend("python")
+    # only the loops numpy cannot vectorize run in kernels,
+    # the envelopes and the modulated oscillators keep their numpy path
+    matrix = np.array([[0, 1], [0, 0.7]]) # the modulator feeds back on itself
+    nodes = [
+            ("fm feedback", lambda: FMVoice(440, ratios=(1, 2), matrix=matrix,
+                    carriers=(1, 0), sample_rate=_rate)),
+            ]
+    for (name, make) in nodes:
+        t_python = time_render(make())
+        dsp_kernels.set_backend("numba")
+        osc = iter(make())
+        start = time.perf_counter()
+        osc.render(_block_size)
+        t_warmup = time.perf_counter() - start
+        t_numba = time_render(make())
+        dsp_kernels.set_backend("python")
+        print(f"  {name:14} python {t_python*1000:8.3f} ms, numba {t_numba*1000:7.3f} ms, "
+                f"speedup {t_python/t_numba:6.1f}, warm up {t_warmup*1000:8.1f} ms")
+
+def bench_sine_lut(freq=440., sizes=(256, 1024, 4096, 16384)):
+    print("Sine lookup table vs math.sin, throughput in Msamples/sec")
+    nb_samples = _nb_blocks * _block_size
+    t_next = time_next(SineOscillator(freq, sample_rate=_rate))
+    t_block = time_render(SineOscillator(freq, sample_rate=_rate))
+    print(f"  sin                     next {nb_samples/t_next/1e6:6.2f}, "
+            f"render {nb_samples/t_block/1e6:7.2f}")
+    # the phase increment is irrational, so every table position is hit
+    freq = _rate / (2 + math.sqrt(2))
+    for size in sizes:
+        for interp in ("nearest", "linear", "cubic"):
+            osc = LutSineOscillator(freq, sample_rate=_rate, table_size=size, interp=interp)
+            t_next = time_next(osc)
+            t_block = time_render(osc)
+            (err, _) = get_errors(osc, SineOscillator(freq, sample_rate=_rate), n=nb_samples)
+            print(f"  {size:6} {interp:8}  next {nb_samples/t_next/1e6:6.2f}, "
+                    f"render {nb_samples/t_block/1e6:7.2f}, max error {20*math.log10(err):7.1f} dB")
+
+#-------------------------------------------
+
+def bench_control_rate(intervals=(8, 32, 128)):
+    print("Control rate modulation vs audio rate, 1 sec of audio")
+    def make(interval):
+        return ModulatedOscillator(
+                SineOscillator(440, sample_rate=_rate),
+                ADSREnvelope(0.01, 0.1, 0.4, sample_rate=_rate),
+                SineOscillator(5, sample_rate=_rate),
+                amp_mod=lambda init_amp, val: init_amp * val,
+                freq_mod=lambda init_freq, val: init_freq + 10 * val,
+                control_interval=interval,
+                )
+    t_audio = time_render(make(1))
+    print(f"  audio rate {t_audio*1000:8.3f} ms")
+    for interval in intervals:
+        t_control = time_render(make(interval))
+        (err, rms) = get_errors(make(interval), make(1), n=_nb_blocks * _block_size)
+        print(f"  interval {interval:4} {t_control*1000:8.3f} ms, saved {1 - t_control/t_audio:6.1%}, "
+                f"max error {err:.2e}, rms error {rms:.2e}")
+
+#-------------------------------------------
+
+def bench_fm(nb_voices=16):
+    print(f"FMBank, 6 operators, {nb_voices} voices, time per block")
+    matrix = np.zeros((6, 6))
+    (matrix[1, 0], matrix[2, 1], matrix[4, 3], matrix[5, 4]) = (1, 2, 1, 1)
+    for backend in ("python", "numba"):
+        if dsp_kernels.set_backend(backend) != backend:
+            continue
+        for feedback in (0, 0.7):
+            matrix[3, 3] = feedback
+            bank = FMBank(ratios=(1, 2, 1, 3, 1, 0.5), matrix=matrix,
+                    carriers=(0, 0, 1, 0, 0, 1), sample_rate=_rate)
+            for i in range(nb_voices):
+                bank.add_voice(i, 110 * 2 ** (i / 12), 1 / nb_voices)
+            bank.render(_block_size) # warm up
+            start = time.perf_counter()
+            for _ in range(_nb_blocks):
+                bank.render(_block_size)
+            t_block = (time.perf_counter() - start) / _nb_blocks
+            print(f"  {backend:6} feedback {feedback:3}: {t_block*1000:7.3f} ms, "
+                    f"real time x{_block_size / _rate / t_block:5.1f}")
+    dsp_kernels.set_backend("python")
+
+#-------------------------------------------
+
+def main():
+    bench_wavetable()
+    bench_blep()
+    bench_dtype()
+    bench_jit()
+    bench_sine_lut()
+    bench_control_rate()
+    bench_fm()
+
+#-------------------------------------------
+
+if __name__ == "__main__":
+    main()
+
+#-------------------------------------------
@@ -0,0 +1,130 @@
+#python3
+"""
+    Band limited oscillators
+    PolyBLEP sawtooth and square, PolyBLAMP triangle
+    rendered in blocks with numpy
+"""
+import math
+import numpy as np
+from base_osc import BaseOsc, phase_to_cycles
+
+def poly_blep(t, dt):
+    """
+    returns the PolyBLEP residual of a step of +2 at t=0,
+    t is the phase in cycles (0 to 1), dt the phase increment,
+    one per sample under frequency modulation
+    """
+    res = np.zeros_like(t)
+    dt = np.broadcast_to(dt, np.shape(t))
+    m = t < dt
+    x = t[m] / dt[m]
+    res[m] = 2 * x - x * x - 1
+    m = t > 1 - dt
+    x = (t[m] - 1) / dt[m]
+    res[m] = x * x + 2 * x + 1
+    return res
+
+#-------------------------------------------
+
+def poly_blamp(d, dt):
+    """
+    returns the PolyBLAMP residual of a slope change of +1 per sample,
+    d is the signed distance to the corner in cycles (-0.5 to 0.5)
+    """
+    res = np.zeros_like(d)
+    dt = np.broadcast_to(dt, np.shape(d))
+    m = np.abs(d) < dt
+    x = 1 - np.abs(d[m]) / dt[m]
+    res[m] = x * x * x / 6
+    return res
+
+#========================================
+
+class BlepOscillator(BaseOsc):
+    """ base class for band limited oscillators, phase is in cycles """
+    def _post_freq_set(self):
+        self._inc = self._get_inc(self._f)
+        self._dt = self._inc * phase_to_cycles
+
+    def _post_phase_set(self):
+        self._p = self._p / 360
+
+    def _initialize_osc(self):
+        self._init_acc()
+
+    def _phase_block(self, n):
+        return (self._acc_block(n) * phase_to_cycles + self._p) % 1
+
+    def _dt_block(self):
+        # per sample increments of a modulated block, as __next__ sees them
+        if self._mod_incs is not None:
+            return self._mod_incs * phase_to_cycles
+        return self._dt
+
+    def _blep_block(self, n):
+        return None
+
+    def render(self, n, out=None):
+        return self._scale_block(self._blep_block(n), out)
+
+    def __next__(self):
+        # per sample access, prefer render for speed
+        return float(self.render(1)[0])
+
+#========================================
+
+class BlepSawtoothOscillator(BlepOscillator):
+    def _blep_block(self, n):
+        # same phase alignment as SawtoothOscillator
+        u = (self._phase_block(n) + 0.75) % 1
+        return 2 * u - 1 - poly_blep(u, self._dt_block())
+
+#========================================
+
+class BlepSquareOscillator(BlepOscillator):
+    """
+    pulse_width is the part of the cycle at the high level,
+    threshold gives the same pulse as SquareOscillator
+    """
+    def __init__(self, freq=440, phase=0, amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), pulse_width=0.5, threshold=None):
+        super().__init__(freq, phase, amp, sample_rate, wave_range)
+        self._shift =0
+        self.pulse_width = pulse_width
+        if threshold is not None:
+            self.threshold = threshold
+
+    @property
+    def threshold(self):
+        return math.sin(math.pi * (0.5 - self.pulse_width))
+
+    @threshold.setter
+    def threshold(self, value):
+        # sine above threshold between asin(th) and pi - asin(th),
+        # clamped, the pulse is always low above 1 and always high below -1
+        self._shift = math.asin(min(max(value, -1), 1)) / (2 * math.pi)
+        self.pulse_width = 0.5 - 2 * self._shift
+
+    def _blep_block(self, n):
+        dt = self._dt_block()
+        pw = self.pulse_width
+        u = (self._phase_block(n) - self._shift) % 1
+        val = np.where(u < pw, 1., -1.)
+        return val + poly_blep(u, dt) - poly_blep((u - pw) % 1, dt)
+
+#========================================
+
+class BlepTriangleOscillator(BlepOscillator):
+    def _blep_block(self, n):
+        dt = self._dt_block()
+        t = self._phase_block(n)
+        # same phase alignment as TriangleOscillator
+        div = t + 0.25
+        val = (np.abs(2 * (div - np.floor(0.5 + div))) - 0.5) * 2
+        # slope is 4 per cycle, it changes by 8 at each corner
+        slope = 8 * dt
+        val -= slope * poly_blamp((t + 0.25) % 1 - 0.5, dt)
+        val += slope * poly_blamp((t + 0.75) % 1 - 0.5, dt)
+        return val
+
+#========================================
@@ -0,0 +1,59 @@
+#python3
+"""
+    Buffer pool
+    Scratch arrays owned by each node and reused from block to block,
+    so steady state rendering does not allocate
+"""
+import numpy as np
+import base_osc # module import, base_osc imports buffer_pool
+
+_allocations =0 # arrays allocated by all pools
+
+def get_allocations():
+    """ returns the number of arrays allocated by the pools in this process """
+    return _allocations
+
+#-------------------------------------------
+
+def reset_allocations():
+    global _allocations
+    _allocations =0
+
+#-------------------------------------------
+
+class BufferPool:
+    """
+    named scratch arrays of one node, an array is allocated again
+    only when the block grows, or its channels or dtype change
+    """
+    def __init__(self):
+        self._buffers = {} # name: array
+        self._ramps = {} # dtype: np.arange
+
+    def get(self, name, n, channels=None, dtype=None):
+        """ returns the (n,) or (n, channels) scratch array name """
+        global _allocations
+        dtype = base_osc.get_dtype() if dtype is None else np.dtype(dtype)
+        buf = self._buffers.get(name)
+        tail = () if channels is None else (channels,)
+        if buf is None or len(buf) < n or buf.shape[1:] != tail or buf.dtype != dtype:
+            buf = self._buffers[name] = np.empty((n,) + tail, dtype=dtype)
+            _allocations += 1
+        return buf[:n]
+
+    def like(self, name, block):
+        """ returns the scratch array name with the shape and dtype of block """
+        channels = block.shape[1] if block.ndim == 2 else None
+        return self.get(name, len(block), channels, block.dtype)
+
+    def ramp(self, n, dtype='float64'):
+        """ returns np.arange(n) in dtype, computed once """
+        global _allocations
+        dtype = np.dtype(dtype)
+        ramp = self._ramps.get(dtype)
+        if ramp is None or len(ramp) < n:
+            ramp = self._ramps[dtype] = np.arange(n, dtype=dtype)
+            _allocations += 1
+        return ramp[:n]
+
+#========================================
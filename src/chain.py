@@ -1,47 +1,174 @@
 #python3
+import numpy as np
+from base_osc import get_dtype, get_channels
+from buffer_pool import BufferPool
+
+def _channels(block):
+    return block.shape[1] if block.ndim == 2 else None
+
+#-------------------------------------------
+
+class ChainPlan:
+    """
+    flat plan of a chain, the roles of the generator and modifiers
+    are resolved once into bound callables,
+    calling the plan with n returns the next n samples
+    """
+    def __init__(self, chain):
+        generator = chain.generator
+        self._next = generator.__next__
+        self._render = getattr(generator, "render", None)
+        self._advances = [mod.__next__ for mod in chain._iter_mods] # stateful modifiers
+        self._calls = [mod.__call__ for mod in chain.modifiers]
+        # per modifier: block method, or stepper and call for the per sample loop
+        self._steps = [(getattr(mod, "process", None),
+                mod.__next__ if mod in chain._iter_mods else None, mod.__call__)
+                for mod in chain.modifiers]
+        self._releasables = chain._releasables
+        self._endables = chain._endables
+        self._chain = chain
+        self._pool = BufferPool()
+        self._channels = None # of the generator and each step, known after the first block
+
+    def trigger_release(self, offset=0):
+        for child in self._releasables:
+            child.trigger_release(offset)
+
+    @property
+    def ended(self):
+        return all(child.ended for child in self._endables)
+
+    @property
+    def channels(self):
+        return self._chain.channels
+
+    def is_active(self):
+        # a plan without envelope never ends
+        return not (self._endables and self.ended)
+
+    def reset(self):
+        """ restarts the chain, its children are iterated again in place """
+        chain = self._chain
+        iter(chain.generator)
+        [iter(mod) for mod in chain._iter_mods]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        val = self._next()
+        for advance in self._advances:
+            advance()
+        for call in self._calls:
+            val = call(val)
+        return val
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        the generator is pulled as a whole block,
+        then each modifier processes the whole block,
+        in scratch arrays once the channels are known
+        """
+        pool = self._pool
+        channels = self._channels
+        if self._render is None:
+            block = np.array([self._next() for _ in range(n)], dtype=get_dtype())
+        elif channels is None:
+            block = self._render(n)
+        else:
+            block = self._render(n, pool.get("gen", n, channels[0]))
+        learned = [_channels(block)]
+        for (i, (process, advance, call)) in enumerate(self._steps):
+            if process is None:
+                block = self._loop(block, advance, call)
+            elif channels is None:
+                block = process(block)
+            elif _channels(block) == channels[i +1] and block.dtype == get_dtype():
+                # same shape, the block is processed in place
+                block = process(block, block)
+            else:
+                block = process(block, pool.get(i, n, channels[i +1]))
+            learned.append(_channels(block))
+        if channels is None:
+            self._channels = learned
+        if out is None:
+            return block.copy()
+        out[:] = block
+        return out
+
+    @staticmethod
+    def _loop(block, advance, call):
+        # modifiers without block method, one sample at a time
+        vals = []
+        for val in block:
+            if advance is not None:
+                advance()
+            vals.append(call(val))
+        return np.array(vals, dtype=get_dtype())
+
+    def __call__(self, n, out=None):
+        return self.render(n, out)
+
+#========================================
 
 class Chain:
     def __init__(self, generator, *modifiers):
         self.generator = generator
         self.modifiers = modifiers
+        # children resolved once, when the chain is built
+        children = (generator,) + modifiers
+        self._releasables = [c for c in children if hasattr(c, "trigger_release")]
+        self._endables = [c for c in children if hasattr(c, "ended")]
+        self._iter_mods = [mod for mod in modifiers if hasattr(mod, "__iter__")]
+        self._owners = {} # attribute: child holding it
         
     def __getattr__(self, attr):
-        val = None
-        if hasattr(self.generator, attr):
-            val = getattr(self.generator, attr)
-        else:
-            for modifier in self.modifiers:
-                if hasattr(modifier, attr):
-                    val = getattr(modifier, attr)
+        owners = self.__dict__.get("_owners")
+        if owners is None:
+            raise AttributeError(f"attribute '{attr}' does not exist")
+        owner = owners.get(attr)
+        if owner is None:
+            for child in (self.generator,) + self.modifiers:
+                if hasattr(child, attr):
+                    owner = owners[attr] = child
                     break
             else:
                 raise AttributeError(f"attribute '{attr}' does not exist")
-        return val
+        return getattr(owner, attr)
+
+    @property
+    def channels(self):
+        """ channels of the output, modifiers declaring channels change them """
+        channels = get_channels(self.generator)
+        for mod in self.modifiers:
+            channels = getattr(mod, "channels", channels)
+        return channels
+
+    def compile(self):
+        """ returns the plan of the chain, to be called per sample or per block """
+        return ChainPlan(self)
     
-    def trigger_release(self):
-        tr = "trigger_release"
-        if hasattr(self.generator, tr):
-            self.generator.trigger_release()
-        for modifier in self.modifiers:
-            if hasattr(modifier, tr):
-                modifier.trigger_release()
+    def trigger_release(self, offset=0):
+        for child in self._releasables:
+            child.trigger_release(offset)
                 
     @property
     def ended(self):
-        ended = []; e = "ended"
-        if hasattr(self.generator, e):
-            ended.append(self.generator.ended)
-        ended.extend([m.ended for m in self.modifiers if hasattr(m, e)])
-        return all(ended)
+        return all(child.ended for child in self._endables)
     
     def __iter__(self):
         iter(self.generator)
-        [iter(mod) for mod in self.modifiers if hasattr(mod, "__iter__")]
+        [iter(mod) for mod in self._iter_mods]
+        self._plan = self.compile()
         return self
         
     def __next__(self):
-        val = next(self.generator)
-        [next(mod) for mod in self.modifiers if hasattr(mod, "__iter__")]
-        for modifier in self.modifiers:
-            val = modifier(val)
-        return val
+        return self._plan.__next__()
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        the generator is pulled as a whole block
+        """
+        return self._plan.render(n, out)
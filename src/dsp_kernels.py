@@ -0,0 +1,86 @@
+#python3
+"""
+    Per sample DSP kernels
+    Compiled with numba when it is installed and selected,
+    otherwise run as pure python,
+    only loops numpy cannot vectorize are kernels, like feedback FM
+"""
+import math
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+_backend = "python"
+_kernels = {} # name: [python function, compiled function]
+
+def kernel(func):
+    """ registers func as a kernel, compiled lazily by the numba backend """
+    _kernels[func.__name__] = [func, None]
+    return func
+
+#-------------------------------------------
+
+def set_backend(name):
+    """
+    selects the kernel backend for this process, "python" or "numba",
+    falls back to "python" when numba is not installed
+    and returns the selected backend
+    """
+    global _backend
+    if name not in ("python", "numba"):
+        raise ValueError(f"backend '{name}' does not exist")
+    if name == "numba" and numba is None:
+        name = "python"
+    _backend = name
+    return _backend
+
+#-------------------------------------------
+
+def get_backend():
+    return _backend
+
+#-------------------------------------------
+
+def get_kernel(name):
+    """ returns the kernel for the current backend """
+    entry = _kernels[name]
+    if _backend == "python":
+        return entry[0]
+    if entry[1] is None:
+        # compiled at the first call, that is the warm up cost
+        entry[1] = numba.njit(entry[0])
+    return entry[1]
+
+#========================================
+
+@kernel
+def fm_feedback_kernel(ops, theta, envs, matrix, last, lo, hi, tables, is_sine, table_size):
+    """
+    FMBank operators lo to hi which take part in a feedback,
+    ops, theta and envs are (voices, operators, samples) arrays,
+    last holds the previous output of each operator and is updated
+    """
+    for v in range(ops.shape[0]):
+        for t in range(ops.shape[2]):
+            for o in range(lo, hi +1):
+                m = 0.
+                for j in range(o):
+                    m += matrix[o, j] * ops[v, j, t]
+                for j in range(o, hi +1):
+                    m += matrix[o, j] * last[v, j]
+                x = theta[v, o, t] + m
+                if is_sine[o]:
+                    w = math.sin(x)
+                else:
+                    # linear interpolation in the padded table
+                    pos = ((x / (2 * math.pi)) % 1.) * table_size
+                    i = int(math.floor(pos))
+                    frac = pos - i
+                    w = tables[o, i+1] + frac * (tables[o, i+2] - tables[o, i+1])
+                ops[v, o, t] = envs[v, o, t] * w
+            for o in range(lo, hi +1):
+                last[v, o] = ops[v, o, t]
+
+#========================================
@@ -0,0 +1,300 @@
+#python3
+"""
+    FM operator network
+    Operators modulate the phase of each other through a modulation matrix,
+    all voices and operators of a bank are rendered as numpy arrays
+"""
+import math
+import numpy as np
+from base_osc import get_dtype, freq_to_inc, phase_to_cycles
+from wavetable import get_table, interpolate
+from adsr_envelope import ADSREnvelope, get_envelope_curves
+from dsp_kernels import get_backend, get_kernel
+
+_acc_to_rad = 2 * math.pi * phase_to_cycles
+_default_envelope = (0.05, 0.2, 0.7, 0.3) # as ADSREnvelope
+
+def _get_op_curves(envelope, sample_rate):
+    # ads curve held on its last value, unit release ramp followed by 0
+    (ads, release) = get_envelope_curves(*envelope, sample_rate)
+    if ads is None:
+        # the sustain level is never reached, the rendered part is held
+        (attack, decay, sustain, _) = envelope
+        size = int((attack + decay) * sample_rate) + 3
+        env = iter(ADSREnvelope(attack, decay, sustain, 0, sample_rate))
+        ads = env.render(size, np.empty(size))
+    return (ads, np.append(release, 0.))
+
+#========================================
+
+class FMBank:
+    """
+    polyphonic FM voices sharing one patch, the operator state
+    is kept as voice x operator arrays,
+    matrix[i][j] is the modulation index (in radians) of operator j on operator i,
+    j < i modulates with the same sample, j >= i is a feedback from the previous sample,
+    carriers[i] is the output level of operator i,
+    envelopes are (attack, decay, sustain, release) per operator,
+    wavetable operators are read with linear interpolation
+    """
+    def __init__(self, ratios=(1, 1), matrix=None, carriers=None, waveforms="sine", \
+                 envelopes=None, max_voices=16, sample_rate=44_100, table_size=2048):
+        nb_ops = len(ratios)
+        self.nb_ops = nb_ops
+        self._sample_rate = sample_rate
+        self._ratios = np.array(ratios, dtype='float64')
+        if matrix is None:
+            # operators in series, the last one is the carrier
+            matrix = np.eye(nb_ops, k=-1)
+        self._matrix = np.array(matrix, dtype='float64')
+        if self._matrix.shape != (nb_ops, nb_ops):
+            raise ValueError(f"matrix must be {nb_ops} x {nb_ops}")
+        if carriers is None:
+            carriers = [0] * (nb_ops -1) + [1]
+        self._carriers = np.array(carriers, dtype='float64')
+        if self._carriers.shape != (nb_ops,):
+            raise ValueError(f"carriers must have {nb_ops} levels")
+        if isinstance(waveforms, str):
+            waveforms = [waveforms] * nb_ops
+        if envelopes is None:
+            envelopes = [_default_envelope] * nb_ops
+        if len(waveforms) != nb_ops or len(envelopes) != nb_ops:
+            raise ValueError(f"waveforms and envelopes must have {nb_ops} items")
+        self._init_waves(waveforms, table_size)
+        self._curves = [_get_op_curves(tuple(env), sample_rate) for env in envelopes]
+        # operators lo to hi take part in a feedback and are rendered per sample
+        fb = [(i, j) for (i, j) in zip(*np.nonzero(self._matrix)) if j >= i]
+        self._lo = min([i for (i, _) in fb], default=nb_ops)
+        self._hi = max([j for (_, j) in fb], default=-1)
+        # a voice has ended when all its carriers have released
+        self._release_len = max([len(self._curves[o][1]) -1
+                for o in np.flatnonzero(self._carriers)], default=0)
+        # per voice state, phases are fixed point accumulators
+        self._acc = np.zeros((max_voices, nb_ops), dtype=np.uint32)
+        self._incs = np.zeros((max_voices, nb_ops), dtype=np.uint32)
+        self._amps = np.zeros(max_voices, dtype='float64')
+        self._pos = np.zeros(max_voices, dtype='int64') # samples since note on
+        self._rpos = np.zeros(max_voices, dtype='int64') # samples since release, < 0 before
+        self._released = np.zeros(max_voices, dtype=bool) # release started or scheduled
+        self._levels = np.zeros((max_voices, nb_ops), dtype='float64') # envelopes at release
+        self._last = np.zeros((max_voices, nb_ops), dtype='float64') # for feedback
+        self._keys = [None] * max_voices
+        self._slots = {} # key: slot index
+        self._count =0
+
+    def _init_waves(self, waveforms, table_size):
+        self._table_size = table_size
+        self._is_sine = np.array([w == "sine" for w in waveforms])
+        self._tables = np.zeros((len(waveforms), table_size + 4), dtype='float64')
+        for (o, waveform) in enumerate(waveforms):
+            if waveform != "sine":
+                self._tables[o] = get_table(waveform, table_size)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def _grow(self):
+        size = len(self._amps) * 2
+        for name in ("_acc", "_incs", "_amps", "_pos", "_rpos", "_released", "_levels", "_last"):
+            old = getattr(self, name)
+            arr = np.zeros((size,) + old.shape[1:], dtype=old.dtype)
+            arr[:self._count] = old[:self._count]
+            setattr(self, name, arr)
+        self._keys.extend([None] * (size - len(self._keys)))
+
+    def add_voice(self, key, freq, amp=1):
+        if key in self._slots:
+            self.remove_voice(key)
+        if self._count == len(self._amps):
+            self._grow()
+        i = self._count
+        self._acc[i] =0
+        self._incs[i] = [freq_to_inc(freq * ratio, self._sample_rate) for ratio in self._ratios]
+        self._amps[i] = amp
+        self._pos[i] =0
+        self._rpos[i] =0
+        self._released[i] = False
+        self._last[i] =0
+        self._keys[i] = key
+        self._slots[key] = i
+        self._count += 1
+
+    def release_voice(self, key, offset=0):
+        """
+        starts the release of the voice envelopes, from their last values,
+        or after offset samples, a scheduled release can be moved until it starts
+        """
+        i = self._slots[key]
+        if self._released[i] and self._rpos[i] >= 0:
+            return
+        # the ads curves are known ahead, the levels at the release are read now
+        pos = self._pos[i] + offset -1
+        for (o, (ads, _)) in enumerate(self._curves):
+            self._levels[i, o] = ads[min(pos, len(ads) -1)] if pos >= 0 else 0
+        self._rpos[i] = -offset
+        self._released[i] = True
+
+    def remove_voice(self, key):
+        """ removes a voice by moving the last voice into its slot """
+        i = self._slots.pop(key)
+        last = self._count -1
+        if i != last:
+            for name in ("_acc", "_incs", "_amps", "_pos", "_rpos", "_released", "_levels", "_last"):
+                arr = getattr(self, name)
+                arr[i] = arr[last]
+            moved = self._keys[last]
+            self._keys[i] = moved
+            self._slots[moved] = i
+        self._keys[last] = None
+        self._count = last
+
+    def set_freq(self, key, freq):
+        self._incs[self._slots[key]] = [freq_to_inc(freq * ratio, self._sample_rate)
+                for ratio in self._ratios]
+
+    def set_amp(self, key, amp):
+        self._amps[self._slots[key]] = amp
+
+    def _wave(self, o, x):
+        if self._is_sine[o]:
+            return np.sin(x)
+        pos = ((x / (2 * np.pi)) % 1) * self._table_size
+        return interpolate(self._tables[o], pos, "linear")
+
+    def _envelopes(self, c, n):
+        steps = np.arange(n)
+        pos = self._pos[:c, None] + steps
+        rpos = self._rpos[:c]
+        released = self._released[:c]
+        envs = np.empty((c, self.nb_ops, n), dtype='float64')
+        for (o, (ads, release)) in enumerate(self._curves):
+            envs[:, o] = ads[np.minimum(pos, len(ads) -1)]
+            if released.any():
+                # a scheduled release starts inside the block
+                r = rpos[released, None] + steps
+                vals = self._levels[:c][released, o, None] * release[np.clip(r, 0, len(release) -1)]
+                envs[released, o] = np.where(r >= 0, vals, envs[released, o])
+        self._pos[:c] += n
+        rpos[released] += n
+        return envs
+
+    def _render_op(self, o, ops, theta, envs):
+        # the modulators of operator o are already rendered
+        mod = np.zeros(theta.shape[::2])
+        for j in np.flatnonzero(self._matrix[o, :o]):
+            mod += self._matrix[o, j] * ops[:, j]
+        ops[:, o] = envs[:, o] * self._wave(o, theta[:, o] + mod)
+
+    def _render_feedback(self, c, ops, theta, envs):
+        (lo, hi) = (self._lo, self._hi)
+        last = self._last[:c]
+        if get_backend() == "numba":
+            get_kernel("fm_feedback_kernel")(ops, theta, envs, self._matrix, last,
+                    lo, hi, self._tables, self._is_sine, self._table_size)
+            return
+        # one sample at a time, all voices at once, the operators
+        # before lo are added to the phases beforehand
+        matrix = self._matrix
+        base = theta[:, lo:hi +1] + np.einsum("vjn,oj->von", ops[:, :lo], matrix[lo:hi +1, :lo])
+        terms = [([(j, matrix[o, j]) for j in range(lo, o) if matrix[o, j]],
+                [(j, matrix[o, j]) for j in range(o, hi +1) if matrix[o, j]])
+                for o in range(lo, hi +1)]
+        for t in range(ops.shape[2]):
+            for (k, (same, prev)) in enumerate(terms):
+                mod = base[:, k, t]
+                for (j, m) in same:
+                    mod = mod + m * ops[:, j, t]
+                for (j, m) in prev:
+                    mod = mod + m * last[:, j]
+                ops[:, lo + k, t] = envs[:, lo + k, t] * self._wave(lo + k, mod)
+            last[:, lo:hi +1] = ops[:, lo:hi +1, t]
+
+    def _remove_ended(self):
+        c = self._count
+        ended = np.flatnonzero(self._released[:c] & (self._rpos[:c] >= self._release_len))
+        # from the last slot, so moved voices are not skipped
+        for i in ended[::-1]:
+            self.remove_voice(self._keys[i])
+
+    def render(self, n, out=None):
+        """
+        returns the sum of all voices for the next n samples,
+        as numpy array, voices are removed at the end of their release
+        """
+        if out is None:
+            out = np.zeros(n, dtype=get_dtype())
+        c = self._count
+        if c == 0:
+            out[:] = 0
+            return out
+        # uint32 accumulators wrap at one cycle
+        acc = self._acc[:c, :, None] + self._incs[:c, :, None] * np.arange(n, dtype=np.uint32)
+        theta = acc * _acc_to_rad
+        self._acc[:c] += self._incs[:c] * np.uint32(n)
+        envs = self._envelopes(c, n)
+        ops = np.empty_like(envs)
+        for o in range(min(self._lo, self.nb_ops)):
+            self._render_op(o, ops, theta, envs)
+        if self._lo <= self._hi:
+            self._render_feedback(c, ops, theta, envs)
+        for o in range(max(self._hi +1, self._lo), self.nb_ops):
+            self._render_op(o, ops, theta, envs)
+        weights = self._amps[:c, None] * self._carriers
+        out[:] = np.einsum("von,vo->n", ops, weights)
+        self._remove_ended()
+        return out
+
+#========================================
+
+class FMVoice:
+    """
+    one FM note with the FMBank patch parameters,
+    for chains and PolySynth.play, the release starts offset samples
+    into the next block, samples already buffered by __next__ are not rendered again
+    """
+    def __init__(self, freq=440, amp=1, ratios=(1, 1), matrix=None, carriers=None, \
+                 waveforms="sine", envelopes=None, sample_rate=44_100, table_size=2048):
+        self.freq = freq
+        self.amp = amp
+        self._bank = FMBank(ratios, matrix, carriers, waveforms, envelopes,
+                1, sample_rate, table_size)
+        self._buf_size = 64 # samples rendered at once for __next__
+
+    def __iter__(self):
+        self._bank.add_voice(0, self.freq, self.amp)
+        self._buf = np.empty(0)
+        self._pos =0
+        return self
+
+    def trigger_release(self, offset=0):
+        if 0 in self._bank:
+            # the bank is ahead of the caller by the buffered samples
+            ahead = len(self._buf) - self._pos
+            self._bank.release_voice(0, max(offset - ahead, 0))
+
+    @property
+    def ended(self):
+        return 0 not in self._bank
+
+    def __next__(self):
+        if self._pos == len(self._buf):
+            self._buf = self._bank.render(self._buf_size, np.empty(self._buf_size))
+            self._pos =0
+        val = self._buf[self._pos]
+        self._pos += 1
+        return float(val)
+
+    def render(self, n, out=None):
+        # buffered samples left by __next__ come first
+        if out is None:
+            out = np.empty(n, dtype=get_dtype())
+        k = min(len(self._buf) - self._pos, n)
+        out[:k] = self._buf[self._pos:self._pos + k]
+        self._pos += k
+        self._bank.render(n - k, out[k:])
+        return out
+
+#========================================
@@ -0,0 +1,174 @@
+#python3
+"""
+    Graph optimizer
+    Rewrites a tree of Chain and WaveAdder generators into a cheaper one
+    with the same output, before it is iterated
+"""
+import numpy as np
+from base_osc import BaseOsc
+from chain import Chain
+from wave_adder_recode import WaveAdder
+from volume import Volume
+from periodic_cache import PeriodicCache, is_periodic
+
+def _is_gain(mod):
+    # constant volume, modulated volumes are subclasses
+    return type(mod) is Volume and np.ndim(mod.amp) == 0
+
+#-------------------------------------------
+
+def _weights(adder):
+    n = len(adder.generators)
+    return [1 / n] * n if adder.weights is None else list(adder.weights)
+
+#-------------------------------------------
+
+def _describe(node):
+    name = type(node).__name__
+    if isinstance(node, BaseOsc):
+        return f"{name}({node.init_freq:g} Hz)"
+    if isinstance(node, Chain):
+        return f"Chain({_describe(node.generator)}, {len(node.modifiers)} modifiers)"
+    if isinstance(node, WaveAdder):
+        return f"WaveAdder({len(node.generators)} generators)"
+    return name
+
+#========================================
+
+class GraphOptimizer:
+    """
+    flattens nested WaveAdders into one weighted sum, merges consecutive
+    Volume gains and caches the subgraphs that never change as periodic buffers,
+    the rewrites are listed in report,
+    the parameters of the graph must not change once it is optimized,
+    max_size = 0 disables the periodic buffers,
+    the oscillators of a cached subgraph are retuned by max_cents at most,
+    so whole cycles fit its buffer, max_cents = 0 caches exact loops only
+    """
+    def __init__(self, max_size=1 << 16, max_cents=1.):
+        self.max_size = max_size
+        self.max_cents = max_cents
+        self.report = []
+
+    def optimize(self, graph):
+        """ returns the rewritten graph, the input graph is not changed """
+        graph = self._rewrite(graph)
+        if self.max_size:
+            graph = self._fold(graph)
+        return graph
+
+    def _log(self, msg):
+        self.report.append(msg)
+
+    def _rewrite(self, node):
+        if isinstance(node, Chain):
+            return self._rewrite_chain(node)
+        if isinstance(node, WaveAdder):
+            return self._rewrite_adder(node)
+        return node
+
+    def _merge_gains(self, mods):
+        merged = []
+        for mod in mods:
+            if _is_gain(mod) and merged and _is_gain(merged[-1]):
+                amp = merged[-1].amp * mod.amp
+                self._log(f"merged Volume gains {merged[-1].amp:g} and {mod.amp:g} into {amp:g}")
+                merged[-1] = Volume(amp)
+            else:
+                merged.append(mod)
+        for mod in merged:
+            if _is_gain(mod) and mod.amp == 1:
+                self._log("removed Volume of gain 1")
+        return [mod for mod in merged if not (_is_gain(mod) and mod.amp == 1)]
+
+    def _rewrite_chain(self, chain):
+        gen = self._rewrite(chain.generator)
+        mods = list(chain.modifiers)
+        if isinstance(gen, Chain):
+            self._log(f"merged nested {_describe(gen)} into its parent Chain")
+            mods = list(gen.modifiers) + mods
+            gen = gen.generator
+        mods = self._merge_gains(mods)
+        if isinstance(gen, WaveAdder) and mods and all(_is_gain(mod) for mod in mods):
+            gain = mods[0].amp
+            self._log(f"moved Volume gain {gain:g} into the weights of {_describe(gen)}")
+            weights = [w * gain for w in _weights(gen)]
+            return WaveAdder(*gen.generators, stereo=gen.stereo, weights=weights)
+        if not mods:
+            self._log(f"removed Chain without modifiers around {_describe(gen)}")
+            return gen
+        return Chain(gen, *mods)
+
+    def _split_gain(self, node):
+        # trailing gains of a chain go into the weight of the adder
+        if not isinstance(node, Chain) or not node.modifiers or not _is_gain(node.modifiers[-1]):
+            return (node, 1)
+        mods = list(node.modifiers)
+        gain = mods.pop().amp
+        self._log(f"moved Volume gain {gain:g} of {_describe(node)} into the adder weights")
+        return (Chain(node.generator, *mods) if mods else node.generator, gain)
+
+    def _rewrite_adder(self, adder):
+        (gens, weights) = ([], [])
+        for (child, weight) in zip(adder.generators, _weights(adder)):
+            (child, gain) = self._split_gain(self._rewrite(child))
+            weight *= gain
+            # a mono adder of stereo generators cannot go into a stereo adder
+            if isinstance(child, WaveAdder) and not (adder.stereo and not child.stereo
+                    and any(child._stereo_gens)):
+                self._log(f"flattened {_describe(child)} into its parent WaveAdder")
+                gens.extend(child.generators)
+                weights.extend(weight * w for w in _weights(child))
+            else:
+                gens.append(child)
+                weights.append(weight)
+        if adder.weights is None and weights == _weights(adder):
+            # nothing was flattened, the average is kept
+            return WaveAdder(*gens, stereo=adder.stereo)
+        return WaveAdder(*gens, stereo=adder.stereo, weights=weights)
+
+    def _cache(self, node):
+        """ returns node as PeriodicCache, None without a period in max_size """
+        cache = PeriodicCache(node, None, self.max_size, self.max_cents)
+        if cache.period is None:
+            self._log(f"kept {_describe(node)} live, no loop within {self.max_size} samples"
+                    f" and {self.max_cents:g} cents")
+            return None
+        self._log(f"cached {_describe(node)} as a periodic buffer of {cache.period} samples")
+        return cache
+
+    def _fold(self, node):
+        if is_periodic(node):
+            return self._cache(node) or node
+        if isinstance(node, Chain):
+            gen = self._fold(node.generator)
+            return node if gen is node.generator else Chain(gen, *node.modifiers)
+        if isinstance(node, WaveAdder):
+            return self._fold_adder(node)
+        return node
+
+    def _fold_adder(self, adder):
+        # the constant generators are summed in one buffer when they have a common period
+        weights = _weights(adder)
+        const = [i for (i, gen) in enumerate(adder.generators) if is_periodic(gen)]
+        if len(const) > 1:
+            group = WaveAdder(*[adder.generators[i] for i in const], stereo=adder.stereo,
+                    weights=[weights[i] for i in const])
+            cache = self._cache(group)
+            if cache is not None:
+                rest = [i for i in range(len(weights)) if i not in const]
+                return WaveAdder(*[self._fold(adder.generators[i]) for i in rest], cache,
+                        stereo=adder.stereo, weights=[weights[i] for i in rest] + [1])
+        gens = [self._fold(gen) for gen in adder.generators]
+        if all(new is old for (new, old) in zip(gens, adder.generators)):
+            return adder
+        return WaveAdder(*gens, stereo=adder.stereo, weights=adder.weights)
+
+#-------------------------------------------
+
+def optimize(graph, max_size=1 << 16, max_cents=1.):
+    """ returns the optimized graph and the list of the rewrites """
+    optimizer = GraphOptimizer(max_size, max_cents)
+    return (optimizer.optimize(graph), optimizer.report)
+
+#========================================
@@ -0,0 +1,140 @@
+#python3
+"""
+    Mipmapped band limited wavetables
+    One table per octave, generated lazily by truncating harmonics
+    and cached on disk as .npy files
+"""
+import os
+import math
+import hashlib
+import numpy as np
+from wavetable import WavetableOscillator, _make_table
+
+_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "tinysynth", "wavetables")
+_mipmap_cache = {} # (name, table_size, cache_dir): MipmapTable
+_table_version = 1 # in the file names, bumped when _generate changes
+
+class MipmapTable:
+    """
+    band limited table set for one single cycle waveform,
+    level 0 keeps table_size/2 harmonics, each level halves them
+    """
+    def __init__(self, waveform="saw", table_size=2048, cache_dir=_cache_dir):
+        if isinstance(waveform, str):
+            self.name = waveform
+            cycle = _make_table(waveform, table_size)[1:-3]
+        else:
+            cycle = np.asarray(waveform, dtype='float64')
+            self.name = hashlib.sha1(cycle.tobytes()).hexdigest()[:16]
+        self._spectrum = np.fft.rfft(cycle)
+        # files of an older generator or another spectrum are not loaded
+        self._tag = f"v{_table_version}_{hashlib.sha1(self._spectrum.tobytes()).hexdigest()[:16]}"
+        self._scale = table_size / len(cycle)
+        self._size = table_size
+        self._cache_dir = cache_dir
+        self.nb_levels = int(math.log2(table_size // 2)) + 1
+        self._levels = [None] * self.nb_levels
+        self._lists = [None] * self.nb_levels # tables as lists, for scalars
+
+    def get_level(self, freq, sample_rate):
+        """ returns the level whose harmonics stay below nyquist at freq """
+        if freq <= 0:
+            return 0
+        level = math.ceil(math.log2(freq * self._size / sample_rate))
+        return min(max(level, 0), self.nb_levels -1)
+
+    def _get_path(self, level):
+        return os.path.join(self._cache_dir, f"{self.name}_{self._size}_{level}_{self._tag}.npy")
+
+    def _load(self, level):
+        if self._cache_dir is None:
+            return None
+        try:
+            table = np.load(self._get_path(level))
+        except (OSError, ValueError):
+            return None
+        # a truncated or foreign file is generated again
+        if table.shape != (self._size + 4,) or table.dtype != np.float64:
+            return None
+        return table
+
+    def _save(self, level, table):
+        if self._cache_dir is None:
+            return
+        path = self._get_path(level)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(tmp, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _generate(self, level):
+        nb_harms = max(self._size // 2 >> level, 1)
+        spec = self._spectrum[:nb_harms +1].copy()
+        table = np.fft.irfft(spec, n=self._size) * self._scale
+        # same padding as wavetable tables
+        return np.concatenate((table[-1:], table, table[:3]))
+
+    def get_table(self, level):
+        """ returns the padded table for level, generated the first time """
+        table = self._levels[level]
+        if table is None:
+            table = self._load(level)
+            if table is None:
+                table = self._generate(level)
+                self._save(level, table)
+            self._levels[level] = table
+        return table
+
+    def get_table_list(self, level):
+        """ returns the padded table for level as python list, faster for scalar reads """
+        table = self._lists[level]
+        if table is None:
+            table = self._lists[level] = self.get_table(level).tolist()
+        return table
+
+#-------------------------------------------
+
+def get_mipmap(waveform="saw", table_size=2048, cache_dir=_cache_dir):
+    """ returns the process wide MipmapTable for waveform """
+    if isinstance(waveform, str):
+        key = (waveform, table_size, cache_dir)
+    else:
+        key = (hashlib.sha1(np.asarray(waveform, dtype='float64').tobytes()).hexdigest(),
+                table_size, cache_dir)
+    mipmap = _mipmap_cache.get(key)
+    if mipmap is None:
+        mipmap = _mipmap_cache[key] = MipmapTable(waveform, table_size, cache_dir)
+    return mipmap
+
+#========================================
+
+class MipmapOscillator(WavetableOscillator):
+    """
+    wavetable oscillator picking its band limited level from freq,
+    waveform can be a name or a single cycle array
+    """
+    def __init__(self, freq=440, phase=0, amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), \
+                 waveform="saw", table_size=2048, interp="linear", cache_dir=_cache_dir):
+        self._mipmap = get_mipmap(waveform, table_size, cache_dir)
+        self._level = None
+        super().__init__(freq, phase, amp, sample_rate, wave_range,
+                waveform, table_size, interp)
+
+    def _init_table(self):
+        self._table = None
+        self._table_list = None
+
+    def _post_freq_set(self):
+        super()._post_freq_set()
+        level = self._mipmap.get_level(abs(self._f), self._sample_rate)
+        if level != self._level:
+            self._level = level
+            self._table = self._mipmap.get_table(level)
+            self._table_list = self._mipmap.get_table_list(level)
+
+#========================================
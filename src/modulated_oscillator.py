@@ -1,60 +1,257 @@
 #python#
+import numpy as np
+from base_osc import BaseOsc, get_block, get_dtype, _phase_bits, _phase_mask
+from buffer_pool import BufferPool
+
+def block_mod(func):
+    """
+    marks a modulation function as array native, it receives the initial
+    value and a block of modulator values and returns the parameter block,
+    numpy expressions also work on the scalars given by __next__
+    """
+    func.block_mod = True
+    return func
+
+#-------------------------------------------
+
+def as_block_mod(func):
+    """
+    returns func as a block function, scalar functions are called per value,
+    into out when given
+    """
+    if func is None or getattr(func, "block_mod", False):
+        return func
+    def scalar_mod(init_val, vals, out=None):
+        if out is None:
+            return np.fromiter((func(init_val, val) for val in vals), dtype='float64', count=len(vals))
+        for (i, val) in enumerate(vals):
+            out[i] = func(init_val, val)
+        return out
+    scalar_mod.scalar_mod = True
+    return scalar_mod
+
+#========================================
 
 class ModulatedOscillator:
-    def __init__(self, oscillator, *modulators, amp_mod=None, freq_mod=None, phase_mod=None):
+    """
+    amp_mod, freq_mod and phase_mod take (init_val, modulator_val),
+    functions marked with block_mod take whole blocks,
+    control_interval > 1 evaluates the modulations once every control_interval
+    samples and ramps linearly to each value over the interval that follows it,
+    the control points keep their spacing from block to block,
+    the modulators themselves are still rendered at audio rate, since
+    envelopes and oscillators have to advance by every sample to keep their timing
+    """
+    def __init__(self, oscillator, *modulators, amp_mod=None, freq_mod=None, phase_mod=None, \
+                 control_interval=1):
         self.oscillator = oscillator
         self.modulators = modulators # list
         self.amp_mod = amp_mod
         self.freq_mod = freq_mod
         self.phase_mod = phase_mod
         self._modulators_count = len(modulators)
+        # index of the modulator used by each modulation
+        self._amp_index =0
+        self._freq_index = 1 if self._modulators_count == 2 else 0
+        self._phase_index = 2 if self._modulators_count == 3 else -1
+        # children resolved once, when the oscillator is built
+        children = modulators + (oscillator,)
+        self._releasables = [c for c in children if hasattr(c, "trigger_release")]
+        self._endables = [c for c in children if hasattr(c, "ended")]
+        self.control_interval = control_interval
+        # modulations resolved once as block functions
+        self._block_mods = (
+                (as_block_mod(amp_mod), self._amp_index, "init_amp"),
+                (as_block_mod(freq_mod), self._freq_index, "init_freq"),
+                (as_block_mod(phase_mod), self._phase_index, "init_phase"),
+                )
+        self._pool = BufferPool()
     
     def __iter__(self):
         iter(self.oscillator)
         [iter(modulator) for modulator in self.modulators]
+        # control rate state, ramp (start, end) of each parameter
+        # and samples left before the next control point
+        self._ctl_ramps = None
+        self._ctl_left =0
+        self._buf = np.empty(0, dtype=get_dtype())
+        self._pos =0
         return self
     
     def _modulate(self, mod_vals):
         if self.amp_mod is not None:
-            new_amp = self.amp_mod(self.oscillator.init_amp, mod_vals[0])
+            new_amp = self.amp_mod(self.oscillator.init_amp, mod_vals[self._amp_index])
             self.oscillator.amp = new_amp
             
         if self.freq_mod is not None:
-            if self._modulators_count == 2:
-                mod_val = mod_vals[1]
-            else:
-                mod_val = mod_vals[0]
-            new_freq = self.freq_mod(self.oscillator.init_freq, mod_val)
+            new_freq = self.freq_mod(self.oscillator.init_freq, mod_vals[self._freq_index])
             self.oscillator.freq = new_freq
             
         if self.phase_mod is not None:
-            if self._modulators_count == 3:
-                mod_val = mod_vals[2]
-            else:
-                mod_val = mod_vals[-1]
-            new_phase = self.phase_mod(self.oscillator.init_phase, mod_val)
+            new_phase = self.phase_mod(self.oscillator.init_phase, mod_vals[self._phase_index])
             self.oscillator.phase = new_phase
     
-    def trigger_release(self):
-        tr = "trigger_release"
-        for modulator in self.modulators:
-            if hasattr(modulator, tr):
-                modulator.trigger_release()
-        if hasattr(self.oscillator, tr):
-            self.oscillator.trigger_release()
+    def trigger_release(self, offset=0):
+        for child in self._releasables:
+            child.trigger_release(offset)
             
     @property
     def ended(self):
-        e = "ended"
-        ended = []
-        for modulator in self.modulators:
-            if hasattr(modulator, e):
-                ended.append(modulator.ended)
-        if hasattr(self.oscillator, e):
-            ended.append(self.oscillator.ended)
-        return all(ended)
+        return all(child.ended for child in self._endables)
 
     def __next__(self):
+        if self.control_interval > 1:
+            # a whole sub-block is rendered, then served sample by sample
+            if self._pos == len(self._buf):
+                k = self.control_interval
+                self._buf = self._render_control(k, self._pool.get("next", k))
+                self._pos =0
+            val = self._buf[self._pos]
+            self._pos += 1
+            return val
         mod_vals = [next(modulator) for modulator in self.modulators]
         self._modulate(mod_vals)
         return next(self.oscillator)
+
+    def _get_params(self, mod_blocks, idx=None):
+        """
+        returns amps, freqs and phases blocks, None if not modulated,
+        at the samples idx only when given
+        """
+        params = []
+        for (func, index, init_name) in self._block_mods:
+            if func is None:
+                params.append(None)
+                continue
+            vals = mod_blocks[index]
+            if idx is not None:
+                vals = np.take(vals, idx, out=self._pool.get(("at", index), len(idx), dtype='float64'),
+                        mode='clip')
+            init_val = getattr(self.oscillator, init_name)
+            param = self._pool.get(init_name, len(vals), dtype='float64')
+            if getattr(func, "scalar_mod", False):
+                func(init_val, vals, param)
+            else:
+                # scalars are broadcast on the block
+                param[...] = func(init_val, vals)
+            params.append(param)
+        return params
+
+    def _get_mod_blocks(self, n):
+        # the modulators are pulled as blocks, in scratch arrays
+        return [get_block(modulator, n, self._pool.get(i, n, dtype='float64'))
+                for (i, modulator) in enumerate(self.modulators)]
+
+    def _get_incs(self, freqs):
+        # same rounding as freq_to_inc, in scratch arrays
+        n = len(freqs)
+        x = np.multiply(freqs, 1 << _phase_bits, out=self._pool.get("incs_x", n, dtype='float64'))
+        np.divide(x, self.oscillator._sample_rate, out=x)
+        np.round(x, out=x)
+        incs = self._pool.get("incs", n, dtype='int64')
+        np.copyto(incs, x, casting='unsafe')
+        return np.bitwise_and(incs, _phase_mask, out=incs)
+
+    def _set_last(self, amp, freqs, phases):
+        osc = self.oscillator
+        if self.amp_mod is not None: osc.amp = amp
+        if self.freq_mod is not None: osc.freq = freqs[-1]
+        if self.phase_mod is not None: osc.phase = phases[-1]
+
+    def _render_params(self, n, out, amps, freqs, phases):
+        """
+        renders the oscillator with per sample parameters,
+        frequency is integrated into the phase accumulator by a cumulative sum
+        """
+        osc = self.oscillator
+        if n == 0:
+            return out
+        if freqs is not None:
+            # the highest frequency only selects the band limited tables,
+            # the per sample increments drive the phase and the blep corrections
+            osc.freq = max(freqs.max(), -freqs.min())
+            osc._mod_incs = self._get_incs(freqs)
+        # amp and phase setters work on arrays for the length of the block
+        if phases is not None: osc.phase = phases
+        if amps is not None: osc.amp = amps
+        try:
+            get_block(osc, n, out)
+        finally:
+            osc._mod_incs = None
+            amp = amps[-1] if amps is not None else None
+            self._set_last(amp, freqs, phases)
+        return out
+
+    def _render_block(self, n, out):
+        return self._render_params(n, out, *self._get_params(self._get_mod_blocks(n)))
+
+    def _render_control(self, n, out=None):
+        # the modulator blocks are read at the control points only,
+        # the samples before the first point end the ramps of the last block,
+        # in scratch arrays
+        if out is None:
+            out = np.empty(n, dtype=get_dtype())
+        if n == 0:
+            return out
+        pool = self._pool
+        k = self.control_interval
+        first = self._ctl_left
+        mod_blocks = self._get_mod_blocks(n)
+        # per sample, index of its ramp start in [start, end, points]
+        # and position in the ramp, read with take(mode='clip'),
+        # a checked take into out copies its input
+        u = np.add(pool.ramp(n, 'int64'), k - first, out=pool.get("u", n, dtype='int64'))
+        frac = pool.get("frac", n, dtype='float64')
+        np.copyto(frac, np.remainder(u, k, out=pool.get("j", n, dtype='int64')))
+        np.add(frac, 1, out=frac)
+        np.divide(frac, k, out=frac)
+        np.floor_divide(u, k, out=u)
+        u_end = np.add(u, 1, out=pool.get("u_end", n, dtype='int64'))
+        nb_points = int(u[-1]) if first < n else 0
+        idx = np.multiply(pool.ramp(nb_points, 'int64'), k, out=pool.get("idx", nb_points, dtype='int64'))
+        np.add(idx, first, out=idx)
+        points = self._get_params(mod_blocks, idx)
+        if self._ctl_ramps is None:
+            # the first point starts at its own value
+            self._ctl_ramps = [None if p is None else (p[0], p[0]) for p in points]
+        ramps = []
+        for (i, p) in enumerate(points):
+            if p is None:
+                ramps.append(None)
+                continue
+            ext = pool.get(("ext", i), nb_points + 2, dtype='float64')
+            ext[:2] = self._ctl_ramps[i]
+            ext[2:] = p
+            start = np.take(ext, u, out=pool.get(("start", i), n, dtype='float64'), mode='clip')
+            ramp = np.take(ext, u_end, out=pool.get(("ramp", i), n, dtype='float64'), mode='clip')
+            np.subtract(ramp, start, out=ramp)
+            np.multiply(ramp, frac, out=ramp)
+            np.add(ramp, start, out=ramp)
+            self._ctl_ramps[i] = (ext[u[-1]], ext[u_end[-1]])
+            ramps.append(ramp)
+        self._ctl_left = (first - n) % k
+        return self._render_params(n, out, *ramps)
+
+    def _render_buffered(self, n, out):
+        # samples left by __next__ come first
+        k = min(len(self._buf) - self._pos, n)
+        out[:k] = self._buf[self._pos:self._pos + k]
+        self._pos += k
+        self._render_control(n - k, out[k:])
+        return out
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        the numpy path is kept with the numba backend,
+        a kernel calling sin per sample was no faster
+        """
+        if out is None:
+            out = np.empty(n, dtype=get_dtype())
+        if self.control_interval > 1:
+            return self._render_buffered(n, out)
+        if isinstance(self.oscillator, BaseOsc):
+            return self._render_block(n, out)
+        for i in range(n):
+            out[i] = self.__next__()
+        return out
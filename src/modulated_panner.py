@@ -1,5 +1,7 @@
 #python3
     
+import numpy as np
+from base_osc import get_block
 from panner import Panner
 
 class ModulatedPanner(Panner):
@@ -14,3 +16,12 @@ class ModulatedPanner(Panner):
     def __next__(self):
         self.r = (next(self.modulator) + 1) / 2
         return self.r
+
+    def _get_rights(self, n):
+        # the modulator is pulled as a block
+        rights = get_block(self.modulator, n, self._pool.get("rights", n))
+        np.add(rights, 1, out=rights)
+        np.divide(rights, 2, out=rights)
+        if n > 0:
+            self.r = rights[-1]
+        return rights
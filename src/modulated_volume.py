@@ -1,9 +1,13 @@
 #python3
+from base_osc import get_block
 from volume import Volume
 class ModulatedVolume(Volume):
     def __init__(self, modulator):
         super().__init__(0.)
         self.modulator = modulator
+        # resolved once, when the volume is built
+        self._releasable = hasattr(modulator, "trigger_release")
+        self._endable = hasattr(modulator, "ended")
         
     def __iter__(self):
         iter(self.modulator)
@@ -13,13 +17,17 @@ class ModulatedVolume(Volume):
         self.amp = next(self.modulator)
         return self.amp
     
-    def trigger_release(self):
-        if hasattr(self.modulator, "trigger_release"):
-            self.modulator.trigger_release()
+    def _get_amps(self, n):
+        # the modulator is pulled as a block, in the block dtype
+        amps = get_block(self.modulator, n, self._pool.get("amps", n))
+        if n > 0:
+            self.amp = amps[-1]
+        return amps
+
+    def trigger_release(self, offset=0):
+        if self._releasable:
+            self.modulator.trigger_release(offset)
     
     @property
     def ended(self):
-        ended = False
-        if hasattr(self.modulator, "ended"):
-            ended = self.modulator.ended
-        return ended
+        return self._endable and self.modulator.ended
@@ -0,0 +1,103 @@
+#python3
+"""
+    Noise oscillator
+    White, pink (Voss-McCartney) and brown noise rendered in blocks
+    from a seedable numpy random generator
+"""
+import numpy as np
+from base_osc import BaseOsc
+
+_colors = ("white", "pink", "brown")
+
+class NoiseOscillator(BaseOsc):
+    """
+    freq and phase are not used, seed gives reproducible renders,
+    the same sequence is produced per sample or in blocks
+    """
+    def __init__(self, color="white", amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), seed=None, \
+                 pink_rows=16, brown_leak=0.995):
+        super().__init__(0, 0, amp, sample_rate, wave_range)
+        if color not in _colors:
+            raise ValueError(f"color '{color}' does not exist")
+        self.color = color
+        self.seed = seed
+        self._pink_rows = pink_rows
+        self._brown_leak = brown_leak
+        self._buf_size = 256 # samples generated at once for __next__
+
+    def _initialize_osc(self):
+        self._rng = np.random.default_rng(self.seed)
+        # pink rows values, row k is updated every 2**k samples
+        self._rows = self._white(self._pink_rows)
+        self._count =0
+        self._brown =0.
+        self._buf = np.empty(0)
+        self._pos =0
+
+    def _white(self, n):
+        return self._rng.random(n) * 2 - 1
+
+    def _pink(self, n):
+        counter = self._count + np.arange(1, n +1)
+        self._count = (self._count + n) % (1 << self._pink_rows)
+        # row k is updated when counter is a multiple of 2**k
+        masks = [counter % (1 << k) == 0 for k in range(self._pink_rows)]
+        # random values are drawn in time order, one white value then
+        # the updated rows, so the sequence does not depend on block sizes
+        nb_draws = 1 + np.sum(masks, axis=0)
+        offsets = np.cumsum(nb_draws) - nb_draws
+        rand = self._white(int(nb_draws.sum()))
+        val = rand[offsets]
+        for (k, mask) in enumerate(masks):
+            # hold each new row value until the next update
+            held = np.concatenate(([self._rows[k]], rand[offsets[mask] + 1 + k]))
+            val += held[np.cumsum(mask)]
+            self._rows[k] = held[-1]
+        return val / (self._pink_rows +1)
+
+    def _brown_noise(self, n):
+        # leaky integrator y = a*y + g*x, in closed form per chunk
+        a = self._brown_leak
+        out = np.empty(n)
+        for start in range(0, n, 1024):
+            x = 0.05 * self._white(min(1024, n - start))
+            powers = a ** np.arange(1, len(x) +1)
+            y = powers * (self._brown + np.cumsum(x / powers) )
+            out[start:start + len(x)] = y
+            self._brown = y[-1]
+        return np.clip(out, -1, 1)
+
+    def _noise_block(self, n):
+        if self.color == "white":
+            return self._white(n)
+        if self.color == "pink":
+            return self._pink(n)
+        return self._brown_noise(n)
+
+    def _get_noise(self, n):
+        # buffered samples left by __next__ come first
+        rest = len(self._buf) - self._pos
+        if rest == 0:
+            return self._noise_block(n)
+        k = min(rest, n)
+        val = self._buf[self._pos:self._pos + k]
+        self._pos += k
+        if k < n:
+            val = np.concatenate((val, self._noise_block(n - k)))
+        return val
+
+    def __next__(self):
+        if self._pos == len(self._buf):
+            self._buf = self._noise_block(self._buf_size)
+            self._pos =0
+        val = self._buf[self._pos]
+        self._pos += 1
+        if self._wave_range != (-1, 1):
+            val = self.squish_val(val, *self._wave_range)
+        return float(val) * self._a
+
+    def render(self, n, out=None):
+        return self._scale_block(self._get_noise(n), out)
+
+#========================================
@@ -0,0 +1,105 @@
+#python3
+"""
+    Polyphonic oscillator bank
+    All voices are rendered in one 2-D numpy operation
+"""
+import numpy as np
+from base_osc import get_dtype, phase_to_cycles, freq_to_inc
+
+_waveforms = ("sine", "saw", "square", "triangle")
+
+class OscillatorBank:
+    def __init__(self, waveform="sine", max_voices=32, sample_rate=44_100, threshold=0):
+        if waveform not in _waveforms:
+            raise ValueError(f"waveform '{waveform}' does not exist")
+        self.waveform = waveform
+        self.threshold = threshold
+        self._sample_rate = sample_rate
+        # per voice state, phases are fixed point accumulators
+        self._phases = np.zeros(max_voices, dtype=np.uint32)
+        self._incs = np.zeros(max_voices, dtype=np.uint32)
+        self._amps = np.zeros(max_voices, dtype='float64')
+        self._keys = [None] * max_voices
+        self._slots = {} # key: slot index
+        self._count =0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def _grow(self):
+        size = len(self._phases) * 2
+        for name in ("_phases", "_incs", "_amps"):
+            old = getattr(self, name)
+            arr = np.zeros(size, dtype=old.dtype)
+            arr[:self._count] = old[:self._count]
+            setattr(self, name, arr)
+        self._keys.extend([None] * (size - len(self._keys)))
+
+    def add_voice(self, key, freq, amp=1, phase=0):
+        """ adds a voice, phase in degrees """
+        if key in self._slots:
+            self.remove_voice(key)
+        if self._count == len(self._phases):
+            self._grow()
+        i = self._count
+        self._phases[i] = freq_to_inc(phase / 360, 1) # phase in cycles
+        self._incs[i] = freq_to_inc(freq, self._sample_rate)
+        self._amps[i] = amp
+        self._keys[i] = key
+        self._slots[key] = i
+        self._count += 1
+
+    def remove_voice(self, key):
+        """ removes a voice by moving the last voice into its slot """
+        i = self._slots.pop(key)
+        last = self._count -1
+        if i != last:
+            self._phases[i] = self._phases[last]
+            self._incs[i] = self._incs[last]
+            self._amps[i] = self._amps[last]
+            moved = self._keys[last]
+            self._keys[i] = moved
+            self._slots[moved] = i
+        self._keys[last] = None
+        self._count = last
+
+    def set_freq(self, key, freq):
+        self._incs[self._slots[key]] = freq_to_inc(freq, self._sample_rate)
+
+    def set_amp(self, key, amp):
+        self._amps[self._slots[key]] = amp
+
+    def _wave(self, ph):
+        if self.waveform == "sine":
+            return np.sin(2 * np.pi * ph)
+        if self.waveform == "square":
+            return np.where(np.sin(2 * np.pi * ph) < self.threshold, -1., 1.)
+        # a quarter cycle ahead, like SawtoothOscillator and the wavetables
+        ph = ph + 0.25
+        val = 2 * (ph - np.floor(0.5 + ph))
+        if self.waveform == "triangle":
+            val = (np.abs(val) - 0.5) * 2
+        return val
+
+    def render(self, n, out=None):
+        """
+        returns the sum of all voices for the next n samples,
+        as numpy array
+        """
+        if out is None:
+            out = np.zeros(n, dtype=get_dtype())
+        c = self._count
+        if c == 0:
+            out[:] = 0
+            return out
+        # uint32 accumulators wrap at one cycle
+        acc = self._phases[:c, None] + self._incs[:c, None] * np.arange(n, dtype=np.uint32)
+        block = self._wave(acc * phase_to_cycles) * self._amps[:c, None]
+        np.sum(block, axis=0, out=out)
+        self._phases[:c] += self._incs[:c] * np.uint32(n)
+        return out
+
+#========================================
@@ -3,46 +3,72 @@
     multiple oscillators object
 """
 import math
-from base_osc import BaseOsc
+import numpy as np
+from base_osc import BaseOsc, get_dtype, phase_to_cycles
+
+_acc_to_rad = 2 * math.pi * phase_to_cycles
 
 class SineOscillator(BaseOsc):
     def _post_freq_set(self):
-        self._step = (2 * math.pi * self._f) / self._sample_rate
+        self._inc = self._get_inc(self._f)
         
     def _post_phase_set(self):
         self._p = (self._p / 360) * 2 * math.pi
         
     def _initialize_osc(self):
-        self._i = 0
+        self._init_acc()
         
     def __next__(self):
-        val = math.sin(self._i + self._p)
-        self._i = self._i + self._step
+        val = math.sin(self._next_acc() * _acc_to_rad + self._p)
         if self._wave_range is not (-1, 1):
             val = self.squish_val(val, *self._wave_range)
         return val * self._a
 
+    def _sine_block(self, n):
+        # phase state is carried exactly as in __next__
+        x = self._pool.get("x", n, dtype='float64')
+        # cast in place, a mixed dtype ufunc allocates its cast input
+        np.copyto(x, self._acc_block(n))
+        np.multiply(x, _acc_to_rad, out=x)
+        np.add(x, self._p, out=x)
+        return np.sin(x, out=x)
+
+    def render(self, n, out=None):
+        return self._scale_block(self._sine_block(n), out)
+
 #========================================
 
 class SawtoothOscillator(BaseOsc):
     def _post_freq_set(self):
-        self._period = self._sample_rate / self._f
-        self._post_phase_set
+        self._inc = self._get_inc(self._f)
         
     def _post_phase_set(self):
-        self._p = ((self._p + 90)/ 360) * self._period
+        # in cycles
+        self._p = (self._p + 90)/ 360
     
     def _initialize_osc(self):
-        self._i = 0
+        self._init_acc()
     
     def __next__(self):
-        div = (self._i + self._p )/self._period
+        div = self._next_acc() * phase_to_cycles + self._p
         val = 2 * (div - math.floor(0.5 + div))
-        self._i = self._i + 1
         if self._wave_range is not (-1, 1):
             val = self.squish_val(val, *self._wave_range)
         return val * self._a
 
+    def _saw_block(self, n):
+        div = self._pool.get("x", n, dtype='float64')
+        np.copyto(div, self._acc_block(n))
+        np.multiply(div, phase_to_cycles, out=div)
+        np.add(div, self._p, out=div)
+        fl = self._pool.get("floor", n, dtype='float64')
+        np.floor(np.add(0.5, div, out=fl), out=fl)
+        np.subtract(div, fl, out=div)
+        return np.multiply(2, div, out=div)
+
+    def render(self, n, out=None):
+        return self._scale_block(self._saw_block(n), out)
+
 #========================================
 
 class SquareOscillator(SineOscillator):
@@ -52,24 +78,37 @@ class SquareOscillator(SineOscillator):
         self.threshold = threshold
     
     def __next__(self):
-        val = math.sin(self._i + self._p)
-        self._i = self._i + self._step
+        val = math.sin(self._next_acc() * _acc_to_rad + self._p)
         if val < self.threshold:
             val = self._wave_range[0]
         else:
             val = self._wave_range[1]
         return val * self._a
 
+    def render(self, n, out=None):
+        low = self._pool.get("low", n, dtype=bool)
+        np.less(self._sine_block(n), self.threshold, out=low)
+        if out is None:
+            out = np.empty(n, dtype=get_dtype())
+        out[:] = self._wave_range[1]
+        np.copyto(out, self._wave_range[0], where=low)
+        return np.multiply(out, self._a, out=out)
+
 #========================================
 
 class TriangleOscillator(SawtoothOscillator):
     def __next__(self):
-        div = (self._i + self._p)/self._period
+        div = self._next_acc() * phase_to_cycles + self._p
         val = 2 * (div - math.floor(0.5 + div))
         val = (abs(val) - 0.5) * 2
-        self._i = self._i + 1
         if self._wave_range is not (-1, 1):
             val = self.squish_val(val, *self._wave_range)
         return val * self._a
 
+    def render(self, n, out=None):
+        val = np.abs(self._saw_block(n), out=self._pool.get("x", n, dtype='float64'))
+        np.subtract(val, 0.5, out=val)
+        np.multiply(val, 2, out=val)
+        return self._scale_block(val, out)
+
 #========================================
@@ -1,10 +1,44 @@
 #python3
+import numpy as np
+from base_osc import get_dtype
+from buffer_pool import BufferPool
 
 class Panner:
+    channels = 2 # the output is always stereo
+
     def __init__(self, r=0.5):
         self.r = r
+        self._pool = BufferPool()
         
     def __call__(self, val):
         r = self.r * 2
         l = 2 - r
         return (l * val, r * val)
+
+    def _get_rights(self, n):
+        return self.r
+
+    def process(self, block, out=None):
+        """
+        returns a mono (n,) or stereo (n, 2) block as a stereo block,
+        out is a (n, 2) buffer
+        """
+        n = len(block)
+        r = self._get_rights(n)
+        if np.ndim(r):
+            # in the block dtype, mixed dtypes are cast through a buffer
+            r = np.multiply(r, 2, out=self._pool.get("r", n))
+            l = np.subtract(2, r, out=self._pool.get("l", n))
+        else:
+            r = r * 2
+            l = 2 - r
+        if out is None:
+            out = np.empty((len(block), 2), dtype=get_dtype())
+        if block.ndim == 2:
+            (left, right) = (block[:, 0], block[:, 1])
+        else:
+            left = right = block
+        # right first, out can be the stereo block itself
+        np.multiply(right, r, out=out[:, 1])
+        np.multiply(left, l, out=out[:, 0])
+        return out
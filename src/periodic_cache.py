@@ -0,0 +1,215 @@
+#python3
+"""
+    Periodic cache
+    A generator with a periodic output is rendered for one period,
+    then its samples are served from the buffer
+    until one of its parameters changes
+"""
+import numpy as np
+from base_osc import BaseOsc, get_block, get_channels, get_dtype, _phase_bits, _phase_mask
+from noise_oscillator import NoiseOscillator
+from chain import Chain
+from wave_adder_recode import WaveAdder
+from volume import Volume
+from panner import Panner
+
+def _get_cents(ratios, sizes, cycles):
+    # detune in cents of whole cycles counts for ratios in cycles per sample,
+    # (oscillators, sizes), a zero frequency fits any size
+    ratios = np.asarray(ratios, dtype='float64').reshape(-1, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cents = np.abs(1200 * np.log2(cycles / (ratios * sizes)))
+    cents[np.broadcast_to(ratios == 0, cents.shape)] =0
+    return cents
+
+#-------------------------------------------
+
+def find_loop(ratios, max_size=1 << 16, max_cents=1.):
+    """
+    returns (size, cycles), the smallest buffer size up to max_size holding
+    a whole number of cycles of every oscillator, ratios are their frequencies
+    in cycles per sample, each frequency is retuned by max_cents at most,
+    None if no size fits
+    """
+    sizes = np.arange(1, max_size +1, dtype='int64')
+    cycles = np.rint(np.outer(ratios, sizes))
+    found = np.flatnonzero((_get_cents(ratios, sizes, cycles) <= max_cents).all(axis=0))
+    if not len(found):
+        return None
+    return (int(sizes[found[0]]), [int(c) for c in cycles[:, found[0]]])
+
+#-------------------------------------------
+
+def is_periodic(node):
+    """
+    returns True for a graph of fixed frequency oscillators with constant amp,
+    constant Volume and Panner modifiers and WaveAdders
+    """
+    if isinstance(node, BaseOsc):
+        # the loop is rendered by the block path, from the phase accumulator
+        return not isinstance(node, NoiseOscillator) and type(node).render is not BaseOsc.render \
+                and np.ndim(node.init_freq) == 0 and np.ndim(node.init_amp) == 0
+    if isinstance(node, Chain):
+        return is_periodic(node.generator) and all(type(mod) in (Volume, Panner)
+                and np.ndim(getattr(mod, "amp", getattr(mod, "r", 0))) == 0
+                for mod in node.modifiers)
+    if isinstance(node, WaveAdder):
+        return all(is_periodic(gen) for gen in node.generators)
+    return False
+
+#-------------------------------------------
+
+def get_nodes(node):
+    """ returns the nodes of a graph, node first """
+    nodes = [node]
+    attrs = vars(node) if hasattr(node, "__dict__") else {}
+    for name in ("generator", "oscillator", "modulator", "node"):
+        if name in attrs:
+            nodes.extend(get_nodes(attrs[name]))
+    for name in ("generators", "oscillators", "modulators", "modifiers"):
+        for child in attrs.get(name, ()):
+            nodes.extend(get_nodes(child))
+    return nodes
+
+#-------------------------------------------
+
+def _get_params(node):
+    # parameters watched for changes
+    if isinstance(node, BaseOsc):
+        return ("freq", "amp", "phase")
+    if type(node) is Volume:
+        return ("amp",)
+    if type(node) is Panner:
+        return ("r",)
+    return ()
+
+#========================================
+
+class PeriodicCache:
+    """
+    serves a periodic generator from a buffer of period samples,
+    the buffer holds a whole number of cycles of every oscillator of the generator,
+    their frequencies are retuned by max_cents at most to fit it,
+    the period is the smallest one up to max_size samples when not given,
+    the generator is rendered live when no period fits,
+    only graphs accepted by is_periodic are cached,
+    the buffer is rendered when the cache is iterated, and dropped
+    when a parameter of the graph changes, the oscillators then
+    go on at their own frequencies from the position of the buffer
+    """
+    def __init__(self, generator, period=None, max_size=1 << 16, max_cents=1.):
+        self.generator = generator
+        self.max_size = max_size
+        nodes = get_nodes(generator)
+        self._oscs = [node for node in nodes if isinstance(node, BaseOsc)]
+        ratios = [osc.init_freq / osc._sample_rate for osc in self._oscs]
+        loop = None
+        if period is None:
+            if is_periodic(generator):
+                loop = find_loop(ratios, max_size, max_cents)
+        elif not is_periodic(generator):
+            raise ValueError(f"{type(generator).__name__} is not a periodic graph")
+        else:
+            cycles = np.rint(np.multiply(ratios, period)).reshape(-1, 1)
+            # the frequencies must fit the given period, rendered live otherwise
+            if (_get_cents(ratios, [period], cycles) <= max_cents).all():
+                loop = (period, [int(c) for c in cycles[:, 0]])
+        (self.period, self.cycles) = (None, None) if loop is None else loop
+        # parameters resolved once, when the cache is built
+        self._params = [(node, attr) for node in nodes for attr in _get_params(node)]
+        self._buf = None
+
+    @property
+    def freqs(self):
+        """ returns the retuned frequencies of the oscillators, None when rendered live """
+        if self.period is None:
+            return None
+        return [cycles * osc._sample_rate / self.period
+                for (osc, cycles) in zip(self._oscs, self.cycles)]
+
+    def _get_offsets(self, cycles, pos):
+        # accumulator offsets of cycles whole cycles over the period, at positions pos
+        return ((((cycles * pos) % self.period) << _phase_bits) + self.period // 2) // self.period
+
+    @property
+    def channels(self):
+        return get_channels(self.generator)
+
+    @property
+    def cached(self):
+        return self._buf is not None
+
+    def _snapshot(self):
+        return [getattr(node, attr) for (node, attr) in self._params]
+
+    def _changed(self):
+        try:
+            return self._snapshot() != self._values
+        except ValueError:
+            # an array parameter was replaced
+            return True
+
+    def __iter__(self):
+        iter(self.generator)
+        self._pos =0
+        self._buf = None
+        if self.period is None:
+            return self
+        self._accs = [(osc, osc._acc, cycles) for (osc, cycles) in zip(self._oscs, self.cycles)]
+        pos = np.arange(self.period +1, dtype='int64')
+        for (osc, cycles) in zip(self._oscs, self.cycles):
+            # per sample increments of the retuned frequency, rounded so
+            # the accumulator is back to its start after the buffer
+            osc._mod_incs = np.diff(self._get_offsets(cycles, pos)) & _phase_mask
+        try:
+            self._buf = get_block(self.generator, self.period)
+        finally:
+            for osc in self._oscs:
+                osc._mod_incs = None
+        # python values for __next__, tuples when stereo
+        vals = self._buf.tolist()
+        self._vals = [tuple(val) for val in vals] if self._buf.ndim == 2 else vals
+        self._values = self._snapshot()
+        return self
+
+    def invalidate(self):
+        """
+        drops the buffer, the oscillators are moved to the position of the buffer
+        and the generator is rendered live from then on
+        """
+        if self._buf is None:
+            return
+        for (osc, acc, cycles) in self._accs:
+            osc._acc = (acc + self._get_offsets(cycles, self._pos)) & _phase_mask
+        self._buf = None
+
+    def __next__(self):
+        if self._buf is not None and self._changed():
+            self.invalidate()
+        if self._buf is None:
+            return next(self.generator)
+        val = self._vals[self._pos]
+        self._pos = (self._pos + 1) % self.period
+        return val
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array,
+        copied from the buffer while the parameters do not change
+        """
+        if self._buf is not None and self._changed():
+            self.invalidate()
+        if self._buf is None:
+            return get_block(self.generator, n, out)
+        if out is None:
+            out = np.empty((n,) + self._buf.shape[1:], dtype=get_dtype())
+        (pos, done) = (self._pos, 0)
+        while done < n:
+            k = min(self.period - pos, n - done)
+            out[done:done + k] = self._buf[pos:pos + k]
+            done += k
+            pos = (pos + k) % self.period
+        self._pos = pos
+        return out
+
+#========================================
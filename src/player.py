@@ -14,7 +14,7 @@ from oscillators import (
         )
 # from wave_adder import WaveAdder
 from wave_adder_recode import WaveAdder
-from adsr_envelope import ADSREnvelope
+from adsr_envelope import ADSREnvelope, CachedADSREnvelope
 from chain import Chain
 from panner import Panner
 from modulated_volume import ModulatedVolume
@@ -176,9 +176,10 @@ stream = sd.OutputStream(
 # """
 
 
-def get_sine_osc(freq=55,  amp=1, rate=44100):
+def get_sine_osc(freq=55,  amp=1, rate=44100, sin=math.sin):
+    # sin can be a lookup table from wavetable.get_lut_sin
     incr = (2 * _pi * freq) / rate
-    return (math.sin(v) * amp for v in itertools.count(start=0, step=incr))
+    return (sin(v) * amp for v in itertools.count(start=0, step=incr))
 
 
 #-------------------------------------------
@@ -197,17 +198,17 @@ def get_samples(notes_dic, num_samples=256):
 #-------------------------------------------
 
 
-def osc_func(freq, amp, sample_rate):
+def osc_func(freq, amp, sample_rate, lfo=None):
+    # a global lfo is shared by all the notes, otherwise each note has its own
+    if lfo is None:
+        lfo = SineOscillator(freq/100, phase=90, sample_rate=sample_rate)
     return iter(
         Chain(
             TriangleOscillator(freq=freq,
                     amp=amp, sample_rate=sample_rate),
-            ModulatedPanner(
-                SineOscillator(freq/100,
-                    phase=90, sample_rate=sample_rate)
-            ),
+            ModulatedPanner(lfo),
             ModulatedVolume(
-                ADSREnvelope(0.01,
+                CachedADSREnvelope(0.01,
                     release_duration=0.001, sample_rate=sample_rate)
             )
         )
@@ -227,9 +228,15 @@ def stop():
 #-------------------------------------------
 
 
-def play_midi():
+def play_midi(bpm=None):
+    # with bpm, the notes are panned by one global lfo, a cycle every 4 beats
     synth = pl.PolySynth()
-    synth.play(osc_func=osc_func)
+    if bpm is None:
+        synth.play(osc_func=osc_func)
+        return
+    synth.set_bpm(bpm)
+    lfo = synth.add_lfo("pan", SineOscillator(phase=90, sample_rate=synth.sample_rate), beats=4)
+    synth.play(osc_func=lambda freq, amp, sample_rate: osc_func(freq, amp, sample_rate, lfo))
 
     
     """
@@ -9,16 +9,23 @@ import sounddevice as sd
 import math
 import itertools
 import numpy as np
+from base_osc import get_block, get_channels, get_dtype, set_dtype
+from buffer_pool import BufferPool
+from voice import Voice
+from render_context import get_context, Shared
+from simple_synth import get_beat_len
 
-def get_sine_osc(freq=55,  amp=1, sample_rate=44100):
+def get_sine_osc(freq=55,  amp=1, sample_rate=44100, sin=math.sin):
+    # sin can be a lookup table from wavetable.get_lut_sin
     incr = (2 * math.pi * freq) / sample_rate
-    return (math.sin(v) * amp for v in itertools.count(start=0, step=incr))
+    return (sin(v) * amp for v in itertools.count(start=0, step=incr))
 
 #-------------------------------------------
 
 
 class PolySynth(object):
-    def __init__(self, amp_scale=0.3, max_amp=0.8, sample_rate=44100, num_samples=1024):
+    def __init__(self, amp_scale=0.3, max_amp=0.8, sample_rate=44100, num_samples=1024, dtype=None, \
+                 silence_db=-96., silence_samples=4096, context=None, bpm=120):
         # Initialize MIDI
         # midi.init()
         if mid.get_input_count() > 0:
@@ -31,6 +38,21 @@ class PolySynth(object):
         self.sample_rate = sample_rate
         self.amp_scale = amp_scale
         self.max_amp = max_amp
+        # dtype sets the sample dtype of all blocks in the process,
+        # float32 streams are written without int16 conversion
+        if dtype is not None: set_dtype(dtype)
+        self.dtype = get_dtype()
+        # released voices end after this many samples below silence_db
+        self.silence_db = silence_db
+        self.silence_samples = silence_samples
+        self._ended_voices = [] # pushed by the voices when they end
+        # ticked once per block, for the nodes shared by several voices
+        self.context = get_context() if context is None else context
+        # global modulators shared by all voices, and their beats per cycle when synced
+        self.lfos = {}
+        self._synced = {}
+        self.bpm = bpm
+        self._pool = BufferPool() # mix and stream buffers, reused from block to block
     
     def _init_stream(self, nchannels):
         # Initialize the Stream object
@@ -38,25 +60,102 @@ class PolySynth(object):
         self.stream = sd.OutputStream(
             samplerate = self.sample_rate,
             channels = nchannels,
-            dtype = 'int16',
+            dtype = self._get_streamType(),
             blocksize = self.num_samples,
             )
         self.stream.start()
 
     #-------------------------------------------
 
+    def _get_streamType(self):
+        return 'float32' if self.dtype == np.float32 else 'int16'
+
+    #-------------------------------------------
+
+    def _to_stream(self, samples):
+        # Return samples in stream format, samples are clipped in place
+        np.clip(samples, -self.max_amp, self.max_amp, out=samples)
+        channels = samples.shape[1] if samples.ndim == 2 else None
+        if self.dtype == np.float32:
+            out = self._pool.get("stream", len(samples), channels, np.float32)
+        else:
+            np.multiply(samples, 32767, out=samples)
+            out = self._pool.get("stream", len(samples), channels, np.int16)
+        np.copyto(out, samples, casting='unsafe')
+        return out
+
+    #-------------------------------------------
+
    
     def _get_samples(self, notes_dict):
-        # Return samples in int16 format
-        samples = []
-        for _ in range(self.num_samples):
-            samples.append(
-                [next(osc[0]) for _, osc in notes_dict.items()]
-            )
-        samples = np.array(samples).sum(axis=1) * self.amp_scale
+        # Return samples in stream format
+        self.context.tick()
+        n = self.num_samples
+        pool = self._pool
+        stereo = any(get_channels(voice) == 2 for voice in notes_dict.values())
+        # the voices are rendered in a scratch array and added in place
+        samples = pool.get("mix", n, 2 if stereo else None)
+        samples.fill(0)
+        for voice in notes_dict.values():
+            if get_channels(voice) == 2:
+                np.add(samples, get_block(voice, n, pool.get("stereo", n, 2)), out=samples)
+            else:
+                block = get_block(voice, n, pool.get("mono", n))
+                for c in range(samples.shape[1] if stereo else 1):
+                    # one channel at a time, a broadcast in place copies the block
+                    col = samples[:, c] if stereo else samples
+                    np.add(col, block, out=col)
+        np.multiply(samples, self.amp_scale, out=samples)
         
-        samples = np.int16(samples.clip(-self.max_amp, self.max_amp) * 32767)
-        return samples.reshape(self.num_samples, -1)
+        samples = self._to_stream(samples)
+        return samples.reshape(n, -1)
+
+    #-------------------------------------------
+
+    def add_lfo(self, name, lfo, beats=None):
+        """
+        adds a global modulator, rendered once per block and shared by all voices,
+        osc_func uses the returned node in place of a per voice modulator,
+        with beats, the lfo makes one cycle every beats at the synth bpm
+        """
+        shared = iter(Shared(lfo, self.context))
+        self.lfos[name] = shared
+        if beats is not None:
+            self._synced[name] = beats
+            self._sync_lfo(name)
+        return shared
+
+    #-------------------------------------------
+
+    def _sync_lfo(self, name):
+        beat_len = get_beat_len(self.bpm, self.sample_rate)
+        self.lfos[name].node.freq = self.sample_rate / (beat_len * self._synced[name])
+
+    #-------------------------------------------
+
+    def set_bpm(self, bpm):
+        """ sets the tempo of the synced lfos """
+        self.bpm = bpm
+        for name in self._synced:
+            self._sync_lfo(name)
+
+    #-------------------------------------------
+
+    def _new_voice(self, osc, key):
+        # chains are started and called through their compiled plan
+        if hasattr(osc, "compile"):
+            osc = iter(osc).compile()
+        return Voice(osc, key, on_end=self._ended_voices.append,
+                silence_db=self.silence_db, silence_samples=self.silence_samples)
+
+    #-------------------------------------------
+
+    def _drop_ended(self, notes_dic):
+        # only the voices which ended in the last block are removed
+        for voice in self._ended_voices:
+            if notes_dic.get(voice.key) is voice:
+                del notes_dic[voice.key]
+        self._ended_voices.clear()
 
     #-------------------------------------------
 
@@ -64,7 +163,7 @@ class PolySynth(object):
         # Check for release trigger, number of channels and init Stream
         tempcf = osc_func(1, 1, self.sample_rate)
         has_trigger = hasattr(tempcf, "trigger_release")
-        tempsm = self._get_samples({-1: [tempcf, False]})
+        tempsm = self._get_samples({-1: tempcf})
         nchannels = tempsm.shape[1]
         self._init_stream(nchannels)
 
@@ -75,6 +174,7 @@ class PolySynth(object):
                     # Play the notes
                     samples = self._get_samples(notes_dic)
                     self.stream.write(samples)
+                    self._drop_ended(notes_dic)
                     
                 # getting midi messages 
                 msg = self.midi_input.poll()
@@ -90,8 +190,7 @@ class PolySynth(object):
                         if (m_type == "note_on" and m_vel == 0 and m_note in notes_dic) \
                                 or (m_type == "note_off" and  m_note in notes_dic):
                             if has_trigger:
-                                notes_dic[m_note][0].trigger_release()
-                                notes_dic[m_note][1] = True
+                                notes_dic[m_note].trigger_release()
                             else:
                                 del notes_dic[m_note]
                                 # print("Note_off: ", msg)
@@ -99,17 +198,11 @@ class PolySynth(object):
                         # Note On
                         elif m_type == "note_on" and m_vel >0 and m_note not in notes_dic:
                             freq = mid.mid2freq(m_note)
-                            notes_dic[m_note] = [
+                            notes_dic[m_note] = self._new_voice(
                                 osc_func(freq=freq, amp=m_vel/127, 
                                 sample_rate=self.sample_rate), 
-                                False,
-                            ]
-
-                if has_trigger:
-                    # Delete notes if ended
-                    ended_notes = [k for k,o in notes_dic.items() if o[0].ended and o[1]]
-                    for note in ended_notes:
-                        del notes_dic[note]
+                                m_note,
+                            )
                             
         except KeyboardInterrupt as err:
             self.stream.close()
@@ -118,6 +211,39 @@ class PolySynth(object):
             
     #-------------------------------------------
 
+    def play_bank(self, bank, close=False):
+        """
+        plays midi notes through an OscillatorBank or an FMBank,
+        all voices are rendered in one block operation,
+        banks with release_voice remove their voices when released
+        """
+        release = getattr(bank, "release_voice", bank.remove_voice)
+        self._init_stream(1)
+        try:
+            while True:
+                if len(bank):
+                    samples = bank.render(self.num_samples) * self.amp_scale
+                    samples = self._to_stream(samples)
+                    self.stream.write(samples.reshape(self.num_samples, -1))
+                
+                msg = self.midi_input.poll()
+                if msg and msg.type in ['note_on', 'note_off']:
+                    m_note = msg.note
+                    m_vel = msg.velocity
+                    # Note Off
+                    if (msg.type == "note_off" or m_vel == 0) and m_note in bank:
+                        release(m_note)
+                    # Note On
+                    elif msg.type == "note_on" and m_vel >0:
+                        bank.add_voice(m_note, mid.mid2freq(m_note), amp=m_vel/127)
+
+        except KeyboardInterrupt as err:
+            self.stream.close()
+            if close:
+                self.midi_input.close()
+
+    #-------------------------------------------
+
 #========================================
 
 if __name__ == "__main__":
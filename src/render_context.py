@@ -0,0 +1,83 @@
+#python3
+"""
+    Render context
+    A block counter shared by the nodes of a render, so a node with
+    several parents is rendered once per block, and the graph is a DAG
+"""
+from base_osc import get_block, get_channels
+from buffer_pool import BufferPool
+
+class RenderContext:
+    """
+    the renderer ticks the context before each block,
+    or before each sample when the graph is rendered per sample
+    """
+    def __init__(self):
+        self.block =0
+
+    def tick(self):
+        self.block += 1
+
+    def render(self, gen, n, out=None):
+        """ ticks the context and returns the next n samples of gen """
+        self.tick()
+        return get_block(gen, n, out)
+
+    def next(self, gen):
+        """ ticks the context and returns the next sample of gen """
+        self.tick()
+        return next(gen)
+
+#-------------------------------------------
+
+_context = RenderContext() # default context of this process
+
+def get_context():
+    """ returns the default render context, ticked by PolySynth and Mixer """
+    return _context
+
+#========================================
+
+class Shared:
+    """
+    wraps a node referenced by several parents, the node is rendered
+    once per block of the context and every parent gets the same samples,
+    it is iterated once, by the first parent
+    """
+    def __init__(self, node, context=None):
+        self.node = node
+        self.context = get_context() if context is None else context
+        self._pool = BufferPool()
+        self._started = False
+        self._block = None # context block of the cached samples
+
+    @property
+    def channels(self):
+        return get_channels(self.node)
+
+    def __iter__(self):
+        if not self._started:
+            iter(self.node)
+            self._started = True
+        return self
+
+    def __next__(self):
+        if self._block != self.context.block:
+            self._val = next(self.node)
+            self._block = self.context.block
+        return self._val
+
+    def render(self, n, out=None):
+        """ returns the samples of the current block, rendered by the first parent """
+        if self._block != self.context.block:
+            channels = 2 if self.channels == 2 else None
+            self._buf = get_block(self.node, n, self._pool.get("buf", n, channels))
+            self._block = self.context.block
+        elif len(self._buf) != n:
+            raise ValueError(f"shared node rendered for {len(self._buf)} and {n} samples in the same block")
+        if out is None:
+            return self._buf.copy()
+        out[...] = self._buf
+        return out
+
+#========================================
@@ -13,6 +13,11 @@ import numpy as np
 import midutils as mid
 import threading
 import time
+from base_osc import get_block, get_dtype, set_dtype, freq_to_inc, phase_to_cycles, _phase_mask
+from oscillators import SineOscillator
+from periodic_cache import PeriodicCache
+from render_context import get_context
+from buffer_pool import BufferPool
 
 #-----------------------------------------
 
@@ -24,9 +29,19 @@ def limit_value(val, min_val=0, max_val=127):
 
 #-----------------------------------------
 
-def gen_sine_osc(freq=55,  amp=1, rate=48000):
-    incr = (2 * math.pi * freq) / rate
-    return (math.sin(v) * amp for v in itertools.count(start=0, step=incr))
+def gen_sine_osc(freq=55,  amp=1, rate=48000, sin=math.sin):
+    # integer phase accumulator, the pitch does not drift over time,
+    # sin can be a lookup table from wavetable.get_lut_sin
+    incr = freq_to_inc(freq, rate)
+    to_rad = 2 * math.pi * phase_to_cycles
+    return (sin((v & _phase_mask) * to_rad) * amp for v in itertools.count(start=0, step=incr))
+
+#-------------------------------------------
+
+def get_beat_len(bpm, rate, nb_ticks=60_000):
+    """ returns the number of samples of one beat at bpm, nb_ticks in milisec per minute """
+    tempo = float(nb_ticks  / bpm)
+    return int((tempo * rate / 1000) )
 
 #-------------------------------------------
 
@@ -77,13 +92,14 @@ class BaseSynth(object):
         self._len =0
         self._curpos =0
         self._looping =0
+        self._dtype = get_dtype()
 
 
     #-------------------------------------------
 
     def _get_zeros(self, frame_count):
-        # Return zeros mples in int16 format
-        samp = np.zeros((frame_count), dtype='float64')
+        # Return zeros samples in sample dtype
+        samp = np.zeros((frame_count), dtype=self._dtype)
         return samp # samp.reshape(frame_count, -1)
 
     #-------------------------------------------
@@ -91,8 +107,8 @@ class BaseSynth(object):
     def _get_frames(self, osc_func, frame_count):
         if osc_func is None:
             # returns blank sample
-            return [0] * frame_count
-        return [next(osc_func) for _ in range(frame_count)]
+            return self._get_zeros(frame_count)
+        return np.fromiter(osc_func, dtype=self._dtype, count=frame_count)
 
     #-------------------------------------------
     
@@ -154,7 +170,7 @@ class Metronome(BaseSynth):
         if bpm <1and bpm > 8000: return
         # bpm =98
         self._tempo = float(self._nb_ticks  / bpm)
-        nb_samples = int((self._tempo * self._rate / 1000) ) # for 8 sounds
+        nb_samples = get_beat_len(bpm, self._rate, self._nb_ticks) # for 8 sounds
         (self._nb_loops, rest_frames) = divmod(nb_samples, self._block_size)
         print(f"nb_loops: {self._nb_loops}, rest_frames: {rest_frames}")
         self._rest_frames = self._get_zeros(rest_frames)
@@ -225,7 +241,10 @@ class SimpleOsc(BaseSynth):
         self._block_size = block_size
         self._freq = freq
         self.max_amp = 0.8
-        self._osc = gen_sine_osc(freq=self._freq, amp=1, rate=self._rate)
+        # the sine never changes, whole cycles of it are served from a buffer,
+        # retuned by a cent at most
+        self._osc = iter(PeriodicCache(SineOscillator(freq=self._freq, amp=1, sample_rate=self._rate)))
+        self._buf = np.empty(block_size, dtype=get_dtype()) # block returned by next
         self.curframes =0
         self.maxframes =0
 
@@ -237,7 +256,7 @@ class SimpleOsc(BaseSynth):
     #-------------------------------------------
 
     def __next__(self):
-        samp = self._get_frames(self._osc, self._block_size)
+        samp = self._osc.render(self._block_size, self._buf)
         return samp
 
     #-------------------------------------------
@@ -289,8 +308,8 @@ class PartOsc(BaseSynth):
             lst.append(val)
             self._curpos +=1
         
-        if not lst: samp = np.zeros((frame_count))
-        else: samp = np.array(lst) 
+        if not lst: samp = self._get_zeros(frame_count)
+        else: samp = np.array(lst, dtype=self._dtype) 
         return samp
 
     #-------------------------------------------
@@ -441,9 +460,11 @@ class Mixer(BaseSynth):
         self._channels = channels
         self._block_size = block_size
         self._track_lst = []
+        self._pulls = [] # per track, returns its next block
         self._timeline = None
         self._seq = None
         self._count =0
+        self._pool = BufferPool() # mix and track buffers, reused from block to block
 
 
     #-------------------------------------------
@@ -473,10 +494,23 @@ class Mixer(BaseSynth):
 # dont forget to the real object to update timeline
         timeline.set_pos(timeline.pos + nb_frames)
 # next(track) returns an array of samples, equivalent to track.get_next method
-        samp_lst = [next(track) for track in self._track_lst if track.is_active()]
-        samp = np.sum(samp_lst, axis=0) / len(samp_lst)
-        # must multiply by 32767 before convert to int16
-        samp = np.int16(samp * self._max_int16) # 32767
+        get_context().tick()
+        # the active tracks are added in place in one pooled array
+        pool = self._pool
+        samp = pool.get("mix", nb_frames, dtype=self._dtype)
+        samp.fill(0)
+        count =0
+        for (i, (track, pull)) in enumerate(zip(self._track_lst, self._pulls)):
+            if track.is_active():
+                np.add(samp, pull(nb_frames, pool.get(("track", i), nb_frames)), out=samp)
+                count +=1
+        if count: np.divide(samp, count, out=samp)
+        if self._dtype != np.float32:
+            # must multiply by 32767 before convert to int16
+            np.multiply(samp, self._max_int16, out=samp) # 32767
+            out = pool.get("int16", nb_frames, dtype=np.int16)
+            np.copyto(out, samp, casting='unsafe')
+            samp = out
         # samp = np.int16(samp.clip(-self.max_amp, self.max_amp) * 32767)
         # Sound Device need array shape(-1, channels)
         return samp.reshape(-1, 1)
@@ -488,20 +522,35 @@ class Mixer(BaseSynth):
 
     #-------------------------------------------
 
+    def _get_pull(self, track):
+        # compiled chains are called with the block size and render in out,
+        # other tracks return their own blocks
+        if callable(track):
+            return track
+        return lambda nb_frames, out: next(track)
+
+    #-------------------------------------------
+
     def set_mixTracks(self, track_lst):
-        self._track_lst = track_lst
+        # chains are started and mixed through their compiled plan
+        self._track_lst = [iter(track).compile() if hasattr(track, "compile") else track
+                for track in track_lst]
+        self._pulls = [self._get_pull(track) for track in self._track_lst]
 
     #-------------------------------------------
 
     def add_mixTrack(self, track):
+        if hasattr(track, "compile"):
+            track = iter(track).compile()
         self._track_lst.append(track)
+        self._pulls.append(self._get_pull(track))
 
     #-------------------------------------------
      
 #========================================
 
 class SimpleSynth(object):
-    def __init__(self, channels=1, rate=48000, blocksize=960):
+    def __init__(self, channels=1, rate=48000, blocksize=960, dtype=None):
         # Constants
         self._channels = channels
         self._rate = rate
@@ -509,6 +558,11 @@ class SimpleSynth(object):
         self.amp_scale = 0.3
         self._stream = None
         self.max_amp = 0.8
+        # dtype sets the sample dtype of all blocks in the process,
+        # the mixer and its tracks are built with it,
+        # float32 streams are written without int16 conversion
+        if dtype is not None: set_dtype(dtype)
+        self._dtype = get_dtype()
         self._mix = Mixer()
         self._timeline = TimeLine()
         self._mix._timeline = self._timeline
@@ -529,6 +583,11 @@ class SimpleSynth(object):
 
 
 
+    #-------------------------------------------
+
+    def _get_streamType(self):
+        return 'float32' if self._dtype == np.float32 else 'int16'
+
     #-------------------------------------------
 
     def _init_stream(self):
@@ -537,7 +596,7 @@ class SimpleSynth(object):
         self._stream = sd.OutputStream(
             samplerate = self._rate,
             channels = self._channels,
-            dtype = 'int16',
+            dtype = self._get_streamType(),
             blocksize = self._blocksize,
             )
         self._stream.start()
@@ -553,7 +612,7 @@ class SimpleSynth(object):
         stream = sd.OutputStream(
             samplerate = self._rate,
             channels = self._channels,
-            dtype = 'int16',
+            dtype = self._get_streamType(),
             blocksize = self._blocksize,
             callback=self._func_callback
             )
@@ -574,15 +633,16 @@ class SimpleSynth(object):
     #-------------------------------------------
 
     def _get_samples(self, notes_dict):
-        # Return samples in int16 format
-        samples = []
-        for _ in range(self._blocksize):
-            samples.append(
-                [next(osc) for _, osc in notes_dict.items()]
-            )
-        samples = np.array(samples).sum(axis=1) * self.amp_scale
+        # Return samples in stream format,
+        # each voice is pulled as a whole block
+        samples = np.zeros(self._blocksize, dtype=self._dtype)
+        for osc in notes_dict.values():
+            samples += get_block(osc, self._blocksize)
+        samples *= self.amp_scale
         
-        samples = np.int16(samples.clip(-self.max_amp, self.max_amp) * 32767)
+        samples = samples.clip(-self.max_amp, self.max_amp)
+        if self._dtype != np.float32:
+            samples = np.int16(samples * 32767)
         return samples.reshape(self._blocksize, -1)
 
     #-------------------------------------------
@@ -0,0 +1,73 @@
+#python3
+"""
+    Voice lifecycle
+    A voice wraps a generator graph and notifies once when it has ended,
+    either when its release completes or when it stays silent
+"""
+import numpy as np
+from base_osc import get_block, get_channels
+
+class Voice:
+    """
+    on_end(voice) is called once, after the block where the voice ended,
+    silence is only counted after the release, so held notes are never cut
+    """
+    def __init__(self, generator, key=None, on_end=None, \
+                 silence_db=-96., silence_samples=4096):
+        self.generator = generator
+        self.key = key
+        self.on_end = on_end
+        self.silence_samples = silence_samples
+        self._threshold = 10 ** (silence_db / 20)
+        # resolved once, when the voice is built
+        self._releasable = hasattr(generator, "trigger_release")
+        self._endable = hasattr(generator, "ended")
+        self.released = False
+        self.ended = False
+        self._silent =0 # samples below the threshold since the release
+
+    def __iter__(self):
+        iter(self.generator)
+        return self
+
+    def __next__(self):
+        return self.render(1)[0]
+
+    @property
+    def channels(self):
+        return get_channels(self.generator)
+
+    @property
+    def releasable(self):
+        return self._releasable
+
+    def trigger_release(self, offset=0):
+        if self._releasable:
+            self.generator.trigger_release(offset)
+        self.released = True
+
+    def _check_end(self, block):
+        if self._endable and self.generator.ended:
+            self._end()
+            return
+        # the peak without a temporary array of abs values
+        if block.size and max(block.max(), -block.min()) < self._threshold:
+            self._silent += len(block)
+            if self._silent >= self.silence_samples:
+                self._end()
+        else:
+            self._silent =0
+
+    def _end(self):
+        self.ended = True
+        if self.on_end is not None:
+            self.on_end(self)
+
+    def render(self, n, out=None):
+        """ returns the next n samples, and checks the end after a release """
+        block = get_block(self.generator, n, out)
+        if self.released and not self.ended:
+            self._check_end(block)
+        return block
+
+#========================================
@@ -1,9 +1,14 @@
 #python3
 
 from collections.abc import Iterable
+import numpy as np
+from base_osc import get_dtype
+from buffer_pool import BufferPool
+
 class Volume:
     def __init__(self, amp=1.):
         self.amp = amp
+        self._pool = BufferPool()
         
     def __call__(self, val):
         _val = None
@@ -12,3 +17,21 @@ class Volume:
         elif isinstance(val, (int, float)):
             _val = val * self.amp
         return _val
+
+    def _get_amps(self, n):
+        return self.amp
+
+    def process(self, block, out=None):
+        """
+        applies the volume to a mono (n,) or stereo (n, 2) block,
+        out can be the block itself
+        """
+        amps = self._get_amps(len(block))
+        if out is None:
+            out = np.empty(block.shape, dtype=get_dtype())
+        if block.ndim == 2 and np.ndim(amps):
+            # one channel at a time, a broadcast in place copies the block
+            for c in range(block.shape[1]):
+                np.multiply(block[:, c], amps, out=out[:, c])
+            return out
+        return np.multiply(block, amps, out=out)
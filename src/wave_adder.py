@@ -1,13 +1,35 @@
 #python
+import numpy as np
+from base_osc import get_block, get_channels
+from buffer_pool import BufferPool
 
 class WaveAdder:
     def __init__(self, *oscillators):
         self.oscillators = oscillators
         self._len = len(oscillators)
+        self._pool = BufferPool()
+        self._channels = None # of the children blocks, known after the first block
     
+    @property
+    def channels(self):
+        return get_channels(self.oscillators[0])
+
     def __iter__(self):
         [iter(osc) for osc in self.oscillators]
         return self
     
     def __next__(self):
         return sum(next(osc) for osc in self.oscillators) / self._len
+
+    def render(self, n, out=None):
+        if self._channels is None:
+            block = np.sum([get_block(osc, n) for osc in self.oscillators], axis=0)
+            self._channels = block.shape[1] if block.ndim == 2 else None
+            return np.divide(block, self._len, out=out)
+        # the children are summed in scratch arrays
+        acc = self._pool.get("acc", n, self._channels)
+        tmp = self._pool.get("tmp", n, self._channels)
+        get_block(self.oscillators[0], n, acc)
+        for osc in self.oscillators[1:]:
+            np.add(acc, get_block(osc, n, tmp), out=acc)
+        return np.divide(acc, self._len, out=out)
@@ -1,36 +1,128 @@
 #python3
-from collections.abc import Iterable
+import numpy as np
+from base_osc import get_block, get_channels
+from buffer_pool import BufferPool
+
+def _to_stereo(val):
+    return (val, val)
+
+#-------------------------------------------
+
+def _to_mono(val):
+    return sum(val)/len(val)
+
+#========================================
 
 class WaveAdder:
-    def __init__(self, *generators, stereo=False):
+    """
+    averages its generators, mono generators are duplicated on both channels
+    when stereo, stereo generators are averaged to mono otherwise,
+    the channels of the generators are resolved when the adder is built,
+    and checked on the first block or sample for generators not declaring them,
+    weights replace the average by a weighted sum of the generators
+    """
+    def __init__(self, *generators, stereo=False, weights=None):
         self.generators = generators
         self.stereo = stereo
-        
-    def _mod_channels(self, _val):
-        val = _val
-        if isinstance(_val, (int, float)) and self.stereo:
-            val = (_val, _val)
-        elif isinstance(_val, Iterable) and not self.stereo:
-            val = sum(_val)/len(_val)
-        return val
-    
-    def trigger_release(self):
-        [gen.trigger_release() for gen in self.generators if hasattr(gen, "trigger_release")]
-    
+        if weights is not None and len(weights) != len(generators):
+            raise ValueError(f"weights must have {len(generators)} items")
+        self.weights = weights
+        # children resolved once, when the adder is built
+        self._releasables = [gen for gen in generators if hasattr(gen, "trigger_release")]
+        self._endables = [gen for gen in generators if hasattr(gen, "ended")]
+        self._set_stereo_gens([get_channels(gen) == 2 for gen in generators])
+        self._checked = False # channels of the generators checked on their output
+        self._pool = BufferPool()
+
+    def _set_stereo_gens(self, stereo_gens):
+        self._stereo_gens = stereo_gens
+        if self.stereo:
+            self._converters = [None if st else _to_stereo for st in stereo_gens]
+        else:
+            self._converters = [_to_mono if st else None for st in stereo_gens]
+
+    @property
+    def channels(self):
+        return 2 if self.stereo else 1
+
+    def trigger_release(self, offset=0):
+        [gen.trigger_release(offset) for gen in self._releasables]
+
     @property
     def ended(self):
-        ended = [gen.ended for gen in self.generators if hasattr(gen, "ended")]
-        return all(ended)
-    
+        return all(gen.ended for gen in self._endables)
+
     def __iter__(self):
         [iter(gen) for gen in self.generators]
         return self
-            
+
     def __next__(self):
-        vals = [self._mod_channels(next(gen)) for gen in self.generators]
+        if not self._checked:
+            # stereo samples are tuples
+            vals = [next(gen) for gen in self.generators]
+            self._set_stereo_gens([np.ndim(val) == 1 for val in vals])
+            self._checked = True
+            vals = [val if conv is None else conv(val) for (val, conv) in zip(vals, self._converters)]
+        else:
+            vals = [next(gen) if conv is None else conv(next(gen))
+                    for (gen, conv) in zip(self.generators, self._converters)]
+        if self.weights is not None:
+            if self.stereo:
+                return (sum(w * v[0] for (w, v) in zip(self.weights, vals)),
+                        sum(w * v[1] for (w, v) in zip(self.weights, vals)))
+            return sum(w * v for (w, v) in zip(self.weights, vals))
         if self.stereo:
             l, r = zip(*vals)
             val = (sum(l)/len(l), sum(r)/len(r))
         else:
             val = sum(vals)/ len(vals)
         return val
+
+    def _get_block(self, gen, is_stereo, n):
+        # in a scratch array with the channels of gen
+        if is_stereo:
+            return get_block(gen, n, self._pool.get("stereo", n, 2))
+        return get_block(gen, n, self._pool.get("mono", n))
+
+    def _add(self, acc, block, weight, first):
+        # adds block to acc with the channels of the adder
+        n = len(block)
+        if block.ndim == 2:
+            if not self.stereo:
+                # mean of the two channels
+                block = np.add(block[:, 0], block[:, 1], out=self._pool.get("mono", n))
+                block /= 2
+        else:
+            if self.stereo:
+                # broadcast on both channels
+                block = block[:, None]
+        if weight is not None:
+            block *= weight
+        if first:
+            acc[...] = block
+        else:
+            np.add(acc, block, out=acc)
+
+    def render(self, n, out=None):
+        """
+        returns the next n samples as numpy array, (n, 2) when stereo,
+        the generators are summed in a preallocated accumulator
+        """
+        acc = self._pool.get("acc", n, 2 if self.stereo else None)
+        weights = [None] * len(self.generators) if self.weights is None else self.weights
+        if not self._checked:
+            # the first blocks give the channels of the generators
+            blocks = [get_block(gen, n) for gen in self.generators]
+            self._set_stereo_gens([block.ndim == 2 for block in blocks])
+            self._checked = True
+        else:
+            blocks = (self._get_block(gen, is_stereo, n)
+                    for (gen, is_stereo) in zip(self.generators, self._stereo_gens))
+        for (i, (block, weight)) in enumerate(zip(blocks, weights)):
+            self._add(acc, block, weight, i == 0)
+        if self.weights is None:
+            return np.divide(acc, len(self.generators), out=out)
+        if out is None:
+            return acc.copy()
+        out[:] = acc
+        return out
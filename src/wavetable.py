@@ -0,0 +1,212 @@
+#python3
+"""
+    Wavetable oscillator
+    Tables are shared by all voices through a process wide cache
+"""
+import math
+import numpy as np
+from base_osc import BaseOsc, phase_to_cycles
+from oscillators import SineOscillator, SquareOscillator
+
+_interps = ("nearest", "linear", "cubic") # interpolation order 0, 1 and 3
+_table_cache = {} # (waveform, table_size): padded table
+_list_cache = {} # (waveform, table_size): padded table as list, for scalars
+
+def _make_table(waveform, table_size):
+    # phase in cycles, aligned with the analytic oscillators
+    x = np.arange(table_size) / table_size
+    if waveform == "sine":
+        table = np.sin(2 * np.pi * x)
+    elif waveform == "square":
+        table = np.where(np.sin(2 * np.pi * x) < 0, -1., 1.)
+    elif waveform in ("saw", "triangle"):
+        div = x + 0.25
+        table = 2 * (div - np.floor(0.5 + div))
+        if waveform == "triangle":
+            table = (np.abs(table) - 0.5) * 2
+    else:
+        raise ValueError(f"waveform '{waveform}' does not exist")
+    # one guard point before and three after, for cubic interpolation
+    # and for positions rounded up to table_size
+    return np.concatenate((table[-1:], table, table[:3]))
+
+#-------------------------------------------
+
+def get_table(waveform="sine", table_size=2048):
+    """
+    returns the padded single cycle table for waveform,
+    computed once per process
+    """
+    key = (waveform, table_size)
+    table = _table_cache.get(key)
+    if table is None:
+        table = _table_cache[key] = _make_table(waveform, table_size)
+    return table
+
+#-------------------------------------------
+
+def get_table_list(waveform="sine", table_size=2048):
+    """ returns the padded table as python list, faster for scalar reads """
+    key = (waveform, table_size)
+    table = _list_cache.get(key)
+    if table is None:
+        table = _list_cache[key] = get_table(waveform, table_size).tolist()
+    return table
+
+#-------------------------------------------
+
+def interpolate(table, pos, interp="linear"):
+    """
+    reads padded table at fractional positions pos,
+    pos can be a scalar or a numpy array
+    """
+    if interp == "nearest":
+        return table[np.asarray(np.floor(pos + 0.5), dtype='int64') + 1]
+    i = np.floor(pos)
+    frac = pos - i
+    i = np.asarray(i, dtype='int64') + 1
+    y0 = table[i]
+    y1 = table[i+1]
+    if interp == "linear":
+        return y0 + frac * (y1 - y0)
+    # cubic Catmull-Rom
+    ym1 = table[i-1]
+    y2 = table[i+2]
+    c1 = 0.5 * (y1 - ym1)
+    c2 = ym1 - 2.5 * y0 + 2 * y1 - 0.5 * y2
+    c3 = 0.5 * (y2 - ym1) + 1.5 * (y0 - y1)
+    return ((c3 * frac + c2) * frac + c1) * frac + y0
+
+#-------------------------------------------
+
+def interpolate_scalar(table, pos, interp="linear"):
+    """ same as interpolate, for one position and a table list """
+    if interp == "nearest":
+        return table[int(pos + 0.5) + 1]
+    i = int(pos)
+    frac = pos - i
+    i += 1
+    y0 = table[i]
+    y1 = table[i+1]
+    if interp == "linear":
+        return y0 + frac * (y1 - y0)
+    ym1 = table[i-1]
+    y2 = table[i+2]
+    c1 = 0.5 * (y1 - ym1)
+    c2 = ym1 - 2.5 * y0 + 2 * y1 - 0.5 * y2
+    c3 = 0.5 * (y2 - ym1) + 1.5 * (y0 - y1)
+    return ((c3 * frac + c2) * frac + c1) * frac + y0
+
+#========================================
+
+class WavetableOscillator(BaseOsc):
+    def __init__(self, freq=440, phase=0, amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), \
+                 waveform="sine", table_size=2048, interp="linear"):
+        super().__init__(freq, phase, amp, sample_rate, wave_range)
+        if interp not in _interps:
+            raise ValueError(f"interpolation '{interp}' does not exist")
+        self.waveform = waveform
+        self.interp = interp
+        self._size = table_size
+        self._acc_scale = phase_to_cycles * table_size # accumulator to table position
+        self._init_table()
+
+    def _init_table(self):
+        self._table = get_table(self.waveform, self._size)
+        self._table_list = get_table_list(self.waveform, self._size)
+
+    def _post_freq_set(self):
+        self._inc = self._get_inc(self._f)
+
+    def _post_phase_set(self):
+        self._p = (self._p / 360) * self._size
+
+    def _initialize_osc(self):
+        self._init_acc()
+
+    def __next__(self):
+        pos = (self._next_acc() * self._acc_scale + self._p) % self._size
+        val = interpolate_scalar(self._table_list, pos, self.interp)
+        if self._wave_range != (-1, 1):
+            val = self.squish_val(val, *self._wave_range)
+        return val * self._a
+
+    def render(self, n, out=None):
+        pos = (self._acc_block(n) * self._acc_scale + self._p) % self._size
+        return self._scale_block(interpolate(self._table, pos, self.interp), out)
+
+#========================================
+
+class LutSine:
+    """
+    reads a sine lookup table instead of calling sin,
+    for SineOscillator and its subclasses,
+    table_size and interp trade precision for speed
+    """
+    def _init_lut(self, table_size, interp):
+        if interp not in _interps:
+            raise ValueError(f"interpolation '{interp}' does not exist")
+        self.interp = interp
+        self._size = table_size
+        self._scale = table_size / (2 * math.pi) # radians to table position
+        self._acc_scale = phase_to_cycles * table_size
+        self._table = get_table("sine", table_size)
+        self._table_list = get_table_list("sine", table_size)
+
+    def _next_sine(self):
+        pos = (self._next_acc() * self._acc_scale + self._p * self._scale) % self._size
+        return interpolate_scalar(self._table_list, pos, self.interp)
+
+    def _sine_block(self, n):
+        pos = (self._acc_block(n) * self._acc_scale + self._p * self._scale) % self._size
+        return interpolate(self._table, pos, self.interp)
+
+#========================================
+
+class LutSineOscillator(LutSine, SineOscillator):
+    def __init__(self, freq=440, phase=0, amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), \
+                 table_size=1024, interp="linear"):
+        super().__init__(freq, phase, amp, sample_rate, wave_range)
+        self._init_lut(table_size, interp)
+
+    def __next__(self):
+        val = self._next_sine()
+        if self._wave_range != (-1, 1):
+            val = self.squish_val(val, *self._wave_range)
+        return val * self._a
+
+#========================================
+
+class LutSquareOscillator(LutSine, SquareOscillator):
+    """ SquareOscillator comparing the table sine to its threshold """
+    def __init__(self, freq=440, phase=0, amp=1, \
+                 sample_rate=44_100, wave_range=(-1, 1), threshold=0, \
+                 table_size=1024, interp="linear"):
+        super().__init__(freq, phase, amp, sample_rate, wave_range, threshold)
+        self._init_lut(table_size, interp)
+
+    def __next__(self):
+        if self._next_sine() < self.threshold:
+            val = self._wave_range[0]
+        else:
+            val = self._wave_range[1]
+        return val * self._a
+
+#-------------------------------------------
+
+def get_lut_sin(table_size=1024, interp="linear"):
+    """
+    returns a sin function of radians reading the sine table,
+    for the sine generators
+    """
+    if interp not in _interps:
+        raise ValueError(f"interpolation '{interp}' does not exist")
+    table = get_table_list("sine", table_size)
+    scale = table_size / (2 * math.pi)
+    def lut_sin(x):
+        return interpolate_scalar(table, (x * scale) % table_size, interp)
+    return lut_sin
+
+#========================================
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from adsr_envelope import ADSREnvelope, CachedADSREnvelope
+
+def _samples(env, n, release_at):
+    env = iter(env)
+    vals = []
+    for i in range(n):
+        if i == release_at:
+            env.trigger_release()
+        vals.append(next(env))
+    return np.array(vals)
+
+def _blocks(env, sizes, release_at):
+    env = iter(env)
+    blocks = []
+    for size in sizes:
+        if sum(map(len, blocks)) == release_at:
+            env.trigger_release()
+        blocks.append(env.render(size))
+    return np.concatenate(blocks)
+
+@pytest.mark.parametrize(("curve", "amount"), [("exp", None), ("log", None),
+        ("power", None), ("power", 3), ("power", 1.5)])
+def test_samples_match_blocks(curve, amount):
+    make = lambda: ADSREnvelope(0.01, 0.02, 0.5, 0.02, 48000, curve, amount)
+    vals = _samples(make(), 3000, 1500)
+    np.testing.assert_allclose(_blocks(make(), [700, 800, 1500], 1500), vals, rtol=0, atol=1e-12)
+
+def test_exp_falls_fast_then_slow():
+    vals = _samples(ADSREnvelope(0.01, 0.02, 0.5, 0.02, 48000, "exp"), 3000, 1500)
+    attack = np.diff(vals[:480])
+    (decay, release) = (np.diff(vals[480:1440]), np.diff(vals[1500:2460]))
+    assert attack[0] < attack[-1]
+    # an RC like drop, the steepest step comes first
+    assert decay[0] < decay[-1] < 0
+    assert release[0] < release[-1] < 0
+
+@pytest.mark.parametrize("cls", [ADSREnvelope, CachedADSREnvelope])
+@pytest.mark.parametrize("curve", ["exp", "log"])
+def test_zero_curve_amount(cls, curve):
+    with pytest.raises(ValueError):
+        cls(0.01, 0.02, 0.5, 0.02, 48000, curve, 0)
+
+@pytest.mark.parametrize("curve", ["linear", "exp"])
+def test_cached_samples_match_blocks(curve):
+    make = lambda: CachedADSREnvelope(0.01, 0.02, 0.5, 0.02, 48000, curve)
+    env = iter(make())
+    vals = []
+    for i in range(3000):
+        if i == 1500:
+            env.trigger_release(37)
+        vals.append(next(env))
+    env = iter(make())
+    block = env.render(1500)
+    env.trigger_release(37)
+    np.testing.assert_array_equal(np.concatenate([block, env.render(1500)]), vals)
+    assert env.ended
@@ -0,0 +1,12 @@
+import numpy as np
+import pytest
+from blep_oscillators import BlepSquareOscillator
+from oscillators import SquareOscillator
+
+@pytest.mark.parametrize(("threshold", "pulse_width"), [(1.5, 0), (1, 0), (-1, 1), (-3, 1)])
+def test_threshold_out_of_range(threshold, pulse_width):
+    osc = iter(BlepSquareOscillator(440, threshold=threshold))
+    assert osc.pulse_width == pulse_width
+    # a constant level, as SquareOscillator gives
+    expected = iter(SquareOscillator(440, threshold=threshold)).render(500)
+    np.testing.assert_allclose(osc.render(500), expected, rtol=0, atol=1e-12)
@@ -0,0 +1,68 @@
+import tracemalloc
+import numpy as np
+import pytest
+import base_osc
+import dsp_kernels
+from oscillators import SineOscillator, TriangleOscillator
+from chain import Chain
+from modulated_panner import ModulatedPanner
+from modulated_volume import ModulatedVolume
+from modulated_oscillator import ModulatedOscillator
+from adsr_envelope import ADSREnvelope
+try:
+    import polysynth
+except (ImportError, OSError): # sounddevice without PortAudio
+    polysynth = None
+
+_n = 4096
+_max_peak = 2048 # python objects of a block, half a block of bool
+
+def _chain():
+    return Chain(TriangleOscillator(300), ModulatedPanner(SineOscillator(3, phase=90)),
+            ModulatedVolume(ADSREnvelope(0.01, 0.1, 0.4)))
+
+def _modulated():
+    return ModulatedOscillator(SineOscillator(440), SineOscillator(5), ADSREnvelope(0.01, 0.1, 0.5),
+            freq_mod=lambda init, val: init * (1 + 0.1 * val), amp_mod=lambda init, val: init * val)
+
+def _block_peak(render):
+    # memory allocated while one block is rendered, as seen by tracemalloc
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        render()
+        return tracemalloc.get_traced_memory()[1] - start
+    finally:
+        tracemalloc.stop()
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+@pytest.mark.parametrize("backend", ["python", "numba"])
+@pytest.mark.parametrize(("make", "shape"), [(_chain, (_n, 2)), (_modulated, (_n,))])
+def test_steady_state_blocks_do_not_allocate(monkeypatch, make, shape, backend, dtype):
+    monkeypatch.setattr(base_osc, "_dtype", base_osc.get_dtype()) # restored after the test
+    base_osc.set_dtype(dtype)
+    old = dsp_kernels.get_backend()
+    dsp_kernels.set_backend(backend)
+    try:
+        gen = iter(make())
+        out = np.empty(shape, dtype=dtype)
+        # the first blocks fill the pools and cover the attack
+        for _ in range(3):
+            gen.render(_n, out)
+        assert _block_peak(lambda: gen.render(_n, out)) < _max_peak
+    finally:
+        dsp_kernels.set_backend(old)
+
+@pytest.mark.skipif(polysynth is None, reason="needs sounddevice and PortAudio")
+@pytest.mark.parametrize("dtype", ["float32", "float64"]) # float32 and int16 streams
+def test_polysynth_blocks_do_not_allocate(monkeypatch, dtype):
+    monkeypatch.setattr(base_osc, "_dtype", base_osc.get_dtype()) # set by PolySynth
+    monkeypatch.setattr(polysynth.mid, "get_input_count", lambda: 1)
+    monkeypatch.setattr(polysynth.mid, "receive_from", lambda port: None)
+    synth = polysynth.PolySynth(num_samples=_n, dtype=dtype)
+    # mono and stereo voices mixed together
+    notes = {key: iter(synth._new_voice(make(), key)) for (key, make) in enumerate([_chain, _modulated])}
+    for _ in range(3):
+        synth._get_samples(notes)
+    assert _block_peak(lambda: synth._get_samples(notes)) < _max_peak
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from fm_voice import FMVoice, FMBank
+from adsr_envelope import CachedADSREnvelope
+from oscillators import SineOscillator
+
+_env = (0.01, 0.02, 0.5, 0.02)
+
+@pytest.mark.parametrize("offset", [0, 1, 37, 1500])
+def test_release_offset_matches_envelope(offset):
+    # one carrier without modulation, the envelope times a sine
+    voice = iter(FMVoice(440, ratios=(1,), matrix=[[0]], carriers=[1], envelopes=[_env],
+            sample_rate=48000))
+    env = iter(CachedADSREnvelope(*_env, 48000))
+    blocks = [voice.render(1000)]
+    env_blocks = [env.render(1000)]
+    voice.trigger_release(offset)
+    env.trigger_release(offset)
+    blocks.append(voice.render(2500))
+    env_blocks.append(env.render(2500))
+    expected = np.concatenate(env_blocks) * iter(SineOscillator(440, sample_rate=48000)).render(3500)
+    np.testing.assert_allclose(np.concatenate(blocks), expected, rtol=0, atol=1e-12)
+    assert voice.ended
+
+def test_scheduled_release_keeps_voice():
+    bank = FMBank(envelopes=[_env] * 2, sample_rate=48000)
+    bank.add_voice("a", 220)
+    bank.render(100)
+    bank.release_voice("a", 5000)
+    bank.render(2000)
+    assert "a" in bank
@@ -0,0 +1,98 @@
+import numpy as np
+from oscillators import SineOscillator, SquareOscillator, TriangleOscillator
+from adsr_envelope import ADSREnvelope
+from chain import Chain
+from panner import Panner
+from volume import Volume
+from modulated_volume import ModulatedVolume
+from wave_adder_recode import WaveAdder
+from base_osc import BaseOsc
+from periodic_cache import PeriodicCache, get_nodes
+from graph_optimizer import optimize
+import midutils
+
+hz = midutils.note2freq
+
+def gen3():
+    # from player.py
+    return WaveAdder(
+        Chain(
+            WaveAdder(SineOscillator(hz("A2")), SineOscillator(hz("C3"))),
+            ModulatedVolume(ADSREnvelope(0.01, 0.1, 0.4)),
+        ),
+        Chain(
+            WaveAdder(
+                Chain(TriangleOscillator(hz("C4")), Panner(0.7)),
+                Chain(TriangleOscillator(hz("E3")), Panner(0.3)),
+                stereo=True,
+            ),
+            ModulatedVolume(ADSREnvelope(0.5)),
+        ),
+        stereo=True,
+    )
+
+def gen4():
+    # from player.py
+    return WaveAdder(
+        Chain(
+            WaveAdder(SineOscillator(hz("A2")), SineOscillator(hz("C3"))),
+            ModulatedVolume(ADSREnvelope(0.01, 0.1, 0.4)),
+        ),
+        Chain(WaveAdder(TriangleOscillator(hz("C4")), SquareOscillator(hz("G4")))),
+        ModulatedVolume(ADSREnvelope(0.5)),
+    )
+
+def exact():
+    # 375 and 750 Hz loop exactly every 128 samples at 48000
+    return WaveAdder(
+        Chain(SineOscillator(375, sample_rate=48_000), Volume(0.5), Volume(0.5)),
+        Chain(SquareOscillator(750, sample_rate=48_000), Panner(0.3)),
+        stereo=True,
+    )
+
+def _render(gen, nb_blocks=200, n=1000):
+    gen = iter(gen)
+    return np.concatenate([gen.render(n) for _ in range(nb_blocks)])
+
+def _retuned(make, graph):
+    # the graph of make with the frequencies of the caches of graph
+    freqs = {}
+    for node in get_nodes(graph):
+        if isinstance(node, PeriodicCache):
+            freqs.update(zip([osc.init_freq for osc in node._oscs], node.freqs))
+    ref = make()
+    for osc in get_nodes(ref):
+        if isinstance(osc, BaseOsc):
+            osc._freq = freqs[osc.init_freq]
+    return ref
+
+def test_player_graphs_are_cached():
+    for make in (gen3, gen4):
+        (graph, report) = optimize(make())
+        assert sum(msg.startswith("cached") for msg in report) == 2
+        # the same output, with the oscillators retuned by a cent at most,
+        # up to the rounding of the increments of the reference
+        ref = _retuned(make, graph)
+        for osc in get_nodes(ref):
+            if isinstance(osc, BaseOsc):
+                assert abs(1200 * np.log2(osc._freq / osc._f)) <= 1
+        np.testing.assert_allclose(_render(graph), _render(ref), rtol=0, atol=1e-4)
+
+def test_exact_periods_are_cached():
+    (graph, report) = optimize(exact())
+    assert any(msg.startswith("cached") for msg in report)
+    assert any(msg.startswith("merged Volume gains") for msg in report)
+    np.testing.assert_allclose(_render(graph), _render(exact()), rtol=0, atol=1e-12)
+
+def test_per_sample_output():
+    (graph, _) = optimize(exact())
+    (graph, ref) = (iter(graph), iter(exact()))
+    vals = np.array([next(graph) for _ in range(1000)])
+    np.testing.assert_allclose(vals, [next(ref) for _ in range(1000)], rtol=0, atol=1e-12)
+
+def test_cent_bound():
+    (graph, report) = optimize(SineOscillator(261.63), max_cents=0)
+    assert not isinstance(graph, PeriodicCache)
+    assert report[-1].startswith("kept")
+    (graph, _) = optimize(SineOscillator(261.63))
+    assert isinstance(graph, PeriodicCache)
@@ -0,0 +1,22 @@
+import numpy as np
+from mipmap_wavetable import MipmapTable, get_mipmap
+
+def test_bad_cache_file_is_generated_again(tmp_path):
+    mipmap = MipmapTable("saw", 256, str(tmp_path))
+    np.save(mipmap._get_path(2), np.zeros(10))
+    table = mipmap.get_table(2)
+    assert table.shape == (260,)
+    np.testing.assert_array_equal(table, mipmap._generate(2))
+    # the file was replaced by the generated table
+    np.testing.assert_array_equal(np.load(mipmap._get_path(2)), table)
+
+def test_file_names_follow_the_spectrum(tmp_path):
+    saw = MipmapTable("saw", 256, str(tmp_path))
+    cycle = MipmapTable(np.sin(2 * np.pi * np.arange(256) / 256), 256, str(tmp_path))
+    assert saw._get_path(0) != MipmapTable("saw", 512, str(tmp_path))._get_path(0)
+    assert saw._tag != cycle._tag
+
+def test_cache_dir_in_key(tmp_path):
+    (a, b) = (str(tmp_path / "a"), str(tmp_path / "b"))
+    assert get_mipmap("square", 256, a) is get_mipmap("square", 256, a)
+    assert get_mipmap("square", 256, b)._cache_dir == b
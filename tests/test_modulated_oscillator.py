@@ -0,0 +1,30 @@
+import numpy as np
+from oscillators import SineOscillator
+from blep_oscillators import BlepSawtoothOscillator, BlepSquareOscillator, BlepTriangleOscillator
+from modulated_oscillator import ModulatedOscillator
+from adsr_envelope import ADSREnvelope
+
+def _fm(osc_class):
+    return ModulatedOscillator(osc_class(440), SineOscillator(5),
+            freq_mod=lambda init, val: init * (1 + 0.5 * val))
+
+def test_blep_frequency_modulation():
+    for osc_class in (BlepSawtoothOscillator, BlepSquareOscillator, BlepTriangleOscillator):
+        (a, b) = (iter(_fm(osc_class)), iter(_fm(osc_class)))
+        vals = np.array([next(a) for _ in range(4000)])
+        block = np.concatenate([b.render(1000) for _ in range(4)])
+        np.testing.assert_allclose(block, vals, rtol=0, atol=1e-9)
+
+def _control():
+    return iter(ModulatedOscillator(SineOscillator(440), SineOscillator(5), ADSREnvelope(0.01, 0.1, 0.5),
+            freq_mod=lambda init, val: init * (1 + 0.1 * val), amp_mod=lambda init, val: init * val,
+            control_interval=16))
+
+def test_control_rate_does_not_depend_on_blocks():
+    block = _control().render(1000)
+    osc = _control()
+    np.testing.assert_array_equal(np.concatenate([osc.render(300), osc.render(700)]), block)
+    # samples served by __next__ keep the same control points
+    osc = _control()
+    parts = [[next(osc) for _ in range(5)], osc.render(293), [next(osc) for _ in range(40)], osc.render(662)]
+    np.testing.assert_array_equal(np.concatenate(parts), block)
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+from oscillator_bank import OscillatorBank
+from oscillators import SineOscillator, SawtoothOscillator, SquareOscillator, TriangleOscillator
+
+@pytest.mark.parametrize(("waveform", "cls"), [("sine", SineOscillator), ("saw", SawtoothOscillator),
+        ("square", SquareOscillator), ("triangle", TriangleOscillator)])
+def test_voices_match_oscillators(waveform, cls):
+    bank = OscillatorBank(waveform)
+    bank.add_voice(1, 440, 0.5, 30)
+    bank.add_voice(2, 330, 0.25)
+    oscs = [iter(cls(440, 30, 0.5)), iter(cls(330, 0, 0.25))]
+    expected = sum(osc.render(2000) for osc in oscs)
+    np.testing.assert_allclose(bank.render(2000), expected, rtol=0, atol=1e-9)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from oscillators import SineOscillator, SawtoothOscillator
+from noise_oscillator import NoiseOscillator
+from wave_adder_recode import WaveAdder
+from periodic_cache import PeriodicCache, find_loop
+import midutils
+
+hz = midutils.note2freq
+
+def _chord():
+    return WaveAdder(*[SawtoothOscillator(hz(name)) for name in ("C4", "E4", "G4")])
+
+def test_find_loop():
+    # 375 Hz at 48000 is one cycle every 128 samples
+    assert find_loop([375 / 48_000]) == (128, [1])
+    assert find_loop([375 / 48_000, 750 / 48_000]) == (128, [1, 2])
+    assert find_loop([]) == (1, [])
+    assert find_loop([440 / 44_100], max_cents=0) == (2205, [22])
+    assert find_loop([261.63 / 44_100], max_cents=0) is None
+
+@pytest.mark.parametrize("sample_rate", [44_100, 48_000])
+@pytest.mark.parametrize("freq", [55, 110, 220, 261.63, 440, 1000])
+def test_real_pitches_are_cached(freq, sample_rate):
+    cache = iter(PeriodicCache(SineOscillator(freq, sample_rate=sample_rate)))
+    assert cache.cached
+    assert abs(1200 * np.log2(cache.freqs[0] / freq)) <= 1
+    # whole cycles of the retuned sine, without seam at the loop points,
+    # up to the rounding of the increment of the reference
+    ref = iter(SineOscillator(cache.freqs[0], sample_rate=sample_rate))
+    for _ in range(20):
+        np.testing.assert_allclose(cache.render(10_000), ref.render(10_000), rtol=0, atol=1e-3)
+
+def test_chord_without_loop_is_rendered_live():
+    cache = iter(PeriodicCache(_chord(), max_cents=0))
+    assert cache.period is None and not cache.cached
+    ref = iter(_chord())
+    for _ in range(10):
+        np.testing.assert_array_equal(cache.render(13_230), ref.render(13_230))
+
+def test_given_period_must_fit():
+    # 0.9977 cycles in 100 samples, 4 cents off
+    cache = iter(PeriodicCache(SineOscillator(hz("A4")), period=100))
+    assert not cache.cached
+    cache = iter(PeriodicCache(SineOscillator(hz("A4")), period=401))
+    assert cache.cached
+    cache = iter(PeriodicCache(SineOscillator(375, sample_rate=48_000), period=256))
+    assert cache.cached
+
+def test_given_period_of_a_graph_that_is_not_periodic():
+    with pytest.raises(ValueError):
+        PeriodicCache(NoiseOscillator(), period=100)
+
+def test_invalidate_goes_on_live():
+    (osc, ref) = (SineOscillator(375, sample_rate=48_000), SineOscillator(375, sample_rate=48_000))
+    (cache, ref) = (iter(PeriodicCache(osc)), iter(ref))
+    np.testing.assert_array_equal(cache.render(300), ref.render(300))
+    osc.freq = ref.freq = 500
+    np.testing.assert_array_equal(cache.render(300), ref.render(300))
+    assert not cache.cached
+
+def test_invalidate_goes_on_from_the_loop_position():
+    osc = SineOscillator(440)
+    cache = iter(PeriodicCache(osc))
+    ref = iter(SineOscillator(cache.freqs[0]))
+    np.testing.assert_allclose(cache.render(1000), ref.render(1000), rtol=0, atol=1e-5)
+    osc.freq = ref.freq = 500
+    np.testing.assert_allclose(cache.render(1000), ref.render(1000), rtol=0, atol=1e-5)
+    assert not cache.cached
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from oscillators import SineOscillator
+from chain import Chain
+from modulated_volume import ModulatedVolume
+from render_context import RenderContext
+try:
+    import polysynth
+except (ImportError, OSError): # sounddevice without PortAudio
+    polysynth = None
+
+pytestmark = pytest.mark.skipif(polysynth is None, reason="needs sounddevice and PortAudio")
+
+@pytest.fixture
+def synth(monkeypatch):
+    monkeypatch.setattr(polysynth.mid, "get_input_count", lambda: 1)
+    monkeypatch.setattr(polysynth.mid, "receive_from", lambda port: None)
+    return polysynth.PolySynth(sample_rate=44100, num_samples=1024, context=RenderContext(), bpm=120)
+
+def test_bpm_retunes_synced_lfo(synth):
+    lfo = synth.add_lfo("lfo", SineOscillator(1, sample_rate=44100), beats=1)
+    assert lfo.node.freq == pytest.approx(2)
+    synth.context.tick()
+    first = lfo.render(1024)
+    synth.set_bpm(240)
+    assert lfo.node.freq == pytest.approx(4)
+    synth.context.tick()
+    second = lfo.render(1024)
+    # the phase goes on at the new rate
+    ref = iter(SineOscillator(2, sample_rate=44100))
+    np.testing.assert_allclose(first, ref.render(1024), rtol=0, atol=1e-12)
+    ref.freq = 4
+    np.testing.assert_allclose(second, ref.render(1024), rtol=0, atol=1e-12)
+
+def test_unsynced_lfo_keeps_its_freq(synth):
+    lfo = synth.add_lfo("lfo", SineOscillator(3, sample_rate=44100))
+    synth.set_bpm(90)
+    assert lfo.node.freq == 3
+
+def test_lfo_is_shared_by_the_voices(synth):
+    lfo = synth.add_lfo("lfo", SineOscillator(5, sample_rate=44100))
+    notes = {key: iter(synth._new_voice(Chain(SineOscillator(freq, sample_rate=44100),
+            ModulatedVolume(lfo)), key)) for (key, freq) in enumerate((220, 330))}
+    synth.dtype = np.dtype("float32") # a float32 stream, without int16 rounding
+    samples = synth._get_samples(notes)
+    mod = iter(SineOscillator(5, sample_rate=44100)).render(1024)
+    expected = sum(iter(SineOscillator(freq, sample_rate=44100)).render(1024) for freq in (220, 330))
+    expected = np.clip(expected * mod * synth.amp_scale, -synth.max_amp, synth.max_amp)
+    np.testing.assert_allclose(samples[:, 0], expected, rtol=0, atol=1e-6)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from oscillators import SineOscillator
+from chain import Chain
+from modulated_volume import ModulatedVolume
+from render_context import RenderContext, Shared
+
+class _Counted(SineOscillator):
+    # counts its blocks and samples
+    def __iter__(self):
+        self.blocks = self.samples =0
+        return super().__iter__()
+
+    def __next__(self):
+        self.samples += 1
+        return super().__next__()
+
+    def render(self, n, out=None):
+        self.blocks += 1
+        return super().render(n, out)
+
+def test_shared_node_is_rendered_once_per_block():
+    context = RenderContext()
+    lfo = _Counted(5)
+    shared = Shared(lfo, context)
+    voices = [iter(Chain(SineOscillator(freq), ModulatedVolume(shared))) for freq in (220, 330, 440)]
+    for _ in range(4):
+        context.tick()
+        blocks = [voice.render(256) for voice in voices]
+    assert lfo.blocks == 4
+    # every reader got the same lfo samples
+    ref = iter(SineOscillator(5)).render(1024)[-256:]
+    for (freq, block) in zip((220, 330, 440), blocks):
+        expected = iter(SineOscillator(freq)).render(1024)[-256:] * ref
+        np.testing.assert_allclose(block, expected, rtol=0, atol=1e-12)
+
+def test_shared_node_is_stepped_once_per_sample():
+    context = RenderContext()
+    lfo = _Counted(5)
+    shared = iter(Shared(lfo, context))
+    vals = []
+    for _ in range(100):
+        context.tick()
+        vals.append([next(shared) for _ in range(3)])
+        # a parent built later does not restart the node
+        iter(shared)
+    assert lfo.samples == 100
+    assert all(a == b == c for (a, b, c) in vals)
+
+def test_other_block_size_in_the_same_block():
+    context = RenderContext()
+    shared = iter(Shared(SineOscillator(5), context))
+    context.tick()
+    shared.render(256)
+    with pytest.raises(ValueError):
+        shared.render(128)
@@ -0,0 +1,54 @@
+import numpy as np
+from oscillators import SineOscillator
+from chain import Chain
+from modulated_volume import ModulatedVolume
+from adsr_envelope import ADSREnvelope
+from voice import Voice
+
+def test_silent_voice_is_culled_after_release():
+    ended = []
+    osc = SineOscillator(440)
+    voice = iter(Voice(osc, "a", on_end=ended.append, silence_samples=2500))
+    osc.amp =0
+    # a silent held note is never cut
+    for _ in range(5):
+        voice.render(1000)
+    assert not voice.ended
+    voice.trigger_release()
+    voice.render(1000)
+    voice.render(1000)
+    assert not voice.ended
+    voice.render(1000)
+    assert voice.ended
+    for _ in range(3):
+        voice.render(1000)
+    assert ended == [voice]
+
+def test_sound_resets_the_silence():
+    osc = SineOscillator(440)
+    voice = iter(Voice(osc, silence_samples=2000))
+    voice.trigger_release()
+    osc.amp =0
+    voice.render(1500)
+    osc.amp =1
+    voice.render(100)
+    osc.amp =0
+    voice.render(1500)
+    assert not voice.ended
+    voice.render(500)
+    assert voice.ended
+
+def test_voice_ends_with_its_release():
+    ended = []
+    gen = Chain(SineOscillator(440), ModulatedVolume(ADSREnvelope(0.01, 0.02, 0.5, 0.02, 48000)))
+    voice = iter(Voice(gen, "a", on_end=ended.append))
+    assert voice.releasable
+    voice.render(1000)
+    voice.trigger_release()
+    voice.render(500)
+    assert not voice.ended
+    # the release lasts 960 samples
+    voice.render(500)
+    assert voice.ended
+    voice.render(500)
+    assert ended == [voice]
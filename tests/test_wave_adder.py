@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import base_osc
+from oscillators import SineOscillator, TriangleOscillator
+from blep_oscillators import BlepSawtoothOscillator
+from wavetable import WavetableOscillator
+from chain import Chain
+from panner import Panner
+from wave_adder_recode import WaveAdder
+
+class _StereoGen:
+    # stereo generator not declaring its channels
+    def __init__(self, freq):
+        self.osc = SineOscillator(freq)
+
+    def __iter__(self):
+        iter(self.osc)
+        return self
+
+    def __next__(self):
+        val = next(self.osc)
+        return (val, val / 2)
+
+def _adder(stereo):
+    return WaveAdder(_StereoGen(330), Chain(TriangleOscillator(220), Panner(0.3)),
+            SineOscillator(110), stereo=stereo)
+
+def test_undeclared_stereo_generator():
+    for stereo in (True, False):
+        (a, b) = (iter(_adder(stereo)), iter(_adder(stereo)))
+        vals = np.array([next(a) for _ in range(3000)])
+        block = np.concatenate([b.render(1000) for _ in range(3)])
+        assert block.shape == ((3000, 2) if stereo else (3000,))
+        np.testing.assert_allclose(block, vals, rtol=0, atol=1e-12)
+
+def test_block_matches_samples():
+    make = lambda: WaveAdder(Chain(TriangleOscillator(300), Panner(0.7)), SineOscillator(220), stereo=True)
+    (a, b) = (iter(make()), iter(make()))
+    vals = np.array([next(a) for _ in range(3000)])
+    np.testing.assert_allclose(np.concatenate([b.render(1024), b.render(1976)]), vals, rtol=0, atol=1e-12)
+
+def _mixed_graph():
+    return WaveAdder(
+        SineOscillator(220),
+        Chain(TriangleOscillator(330, amp=0.8), Panner(0.3)),
+        BlepSawtoothOscillator(110, amp=0.6),
+        WavetableOscillator(440, amp=0.4, interp="cubic"),
+        stereo=True,
+        )
+
+def test_float32_stays_within_bound(monkeypatch):
+    monkeypatch.setattr(base_osc, "_dtype", base_osc.get_dtype()) # restored after the test
+    blocks = {}
+    for dtype in ("float64", "float32"):
+        base_osc.set_dtype(dtype)
+        gen = iter(_mixed_graph())
+        blocks[dtype] = np.concatenate([gen.render(1024) for _ in range(43)])
+        assert blocks[dtype].dtype == dtype
+    assert np.abs(blocks["float32"] - blocks["float64"]).max() <= 1e-6
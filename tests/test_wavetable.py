@@ -0,0 +1,43 @@
+import math
+import numpy as np
+import pytest
+from oscillators import SineOscillator, SquareOscillator
+from wavetable import WavetableOscillator, LutSineOscillator, LutSquareOscillator, get_lut_sin
+from modulated_oscillator import ModulatedOscillator
+from dsp_kernels import get_backend, set_backend
+from mipmap_wavetable import MipmapOscillator
+
+def test_lut_square():
+    (a, b) = (iter(LutSquareOscillator(441, threshold=0.3)), iter(LutSquareOscillator(441, threshold=0.3)))
+    vals = np.array([next(a) for _ in range(2000)])
+    np.testing.assert_array_equal(b.render(2000), vals)
+    ref = iter(SquareOscillator(441, threshold=0.3)).render(2000)
+    assert np.mean(vals == ref) > 0.99
+
+@pytest.mark.parametrize("interp", ["nearest", "linear", "cubic"])
+@pytest.mark.parametrize("cls", [WavetableOscillator, MipmapOscillator])
+def test_wavetable_next_matches_render(cls, interp, tmp_path):
+    kwargs = {"cache_dir": str(tmp_path)} if cls is MipmapOscillator else {}
+    make = lambda: iter(cls(441, phase=30, waveform="square", interp=interp, **kwargs))
+    osc = make()
+    vals = np.array([next(osc) for _ in range(2000)])
+    np.testing.assert_allclose(make().render(2000), vals, rtol=0, atol=1e-12)
+
+def test_lut_sin():
+    lut_sin = get_lut_sin(4096, "cubic")
+    x = np.linspace(-10, 10, 1001)
+    assert max(abs(lut_sin(v) - math.sin(v)) for v in x) < 1e-6
+
+def test_lut_sine_keeps_its_table_with_numba():
+    pytest.importorskip("numba")
+    make = lambda: ModulatedOscillator(LutSineOscillator(440, table_size=64, interp="nearest"),
+            SineOscillator(3), amp_mod=lambda init, val: init * val)
+    backend = get_backend()
+    try:
+        blocks = []
+        for name in ("python", "numba"):
+            set_backend(name)
+            blocks.append(iter(make()).render(4000))
+    finally:
+        set_backend(backend)
+    np.testing.assert_allclose(blocks[0], blocks[1], rtol=0, atol=1e-12)